@@ -0,0 +1,273 @@
+"""
+IPTV Editor Pro benchmarks - run on a desktop, no Kivy needed.
+  python bench.py mem [channels]
+  python bench.py tok [lines]
+  python bench.py par [channels] [max workers]
+  python bench.py cty [groups]
+  python bench.py suite [quick|full] [out.json]
+  python bench.py cmp base.json new.json [tolerance %]
+"""
+
+import sys, os, re, json, random, platform, time, tracemalloc, gc
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+try: import resource
+except ImportError: resource = None
+
+from core import (COUNTRIES, detect_c, detect_many, parse_m3u, parse_lines, str_lines, gen_m3u, tok_extinf,
+    dedup, get_expire, SmartLinkExtractor)
+
+# Pre-tokenizer #EXTINF handling: three searches per line
+GRP_RE = re.compile(r'group-title="([^"]*)"')
+LOGO_RE = re.compile(r'tvg-logo="([^"]*)"')
+NAME_RE = re.compile(r',([^,]+)$')
+
+# ==================== SYNTHETIC DATA ====================
+def synth_m3u(n, seed=1, dup=0.0):
+    """Playlist text shaped like a real m3u_plus dump: few groups, shared logos; dup = share of repeated URLs"""
+    rnd = random.Random(seed)
+    grps = [f'{c}: {k}' for c in ('TR', 'DE', 'UK', 'FR', 'IT', 'AR', 'US') for k in ('Ulusal', 'Spor', 'Film', 'Haber', 'Belgesel', 'Cocuk')]
+    grps += [f'VOD {y}' for y in range(1990, 2025)]
+    out = ['#EXTM3U']
+    for i in range(n):
+        g = rnd.choice(grps)
+        out.append(f'#EXTINF:-1 tvg-id="ch{i}.{g[:2].lower()}" tvg-name="{g[:2]} Kanal {i}" tvg-logo="http://logo.example.com/{g[:2]}/{i % 400}.png" group-title="{g}",{g[:2]}: Kanal {i}')
+        u = rnd.randrange(i) if dup and i and rnd.random() < dup else i
+        out.append(f'http://panel.example.com:8080/live/user/pass/{100000 + u}.ts')
+    return '\n'.join(out)
+
+def synth_chat(nbytes, seed=1):
+    """Telegram-style dump of about nbytes: chatter with m3u links and portal/user/pass posts mixed in"""
+    rnd = random.Random(seed)
+    words = 'merhaba selam yeni liste calisiyor mu test hepsi acik donmuyor tesekkurler kanal mac bugun'.split()
+    out, n = [], 0
+    while n < nbytes:
+        k = rnd.random()
+        h = f'http://srv{rnd.randrange(500)}.example.net:{rnd.choice((8080, 80, 25461, 2095))}'
+        u, p = f'u{rnd.randrange(10 ** 6)}', f'p{rnd.randrange(10 ** 6)}'
+        if k < .15: m = f'🔥 {h}/get.php?username={u}&password={p}&type=m3u_plus 🔥'
+        elif k < .17: m = f'🎬 𝕄𝟛𝕦 {h}/{u}/{p}/playlist.m3u8'
+        elif k < .172: m = f'👀 ℙ𝕠𝕣𝕥𝕒𝕝 {h}\n👥 𝕌𝕤𝕖𝕣 {u}\n🔑 ℙ𝕒𝕤𝕤 {p}\n📆 Exp: 2026-0{rnd.randint(1, 9)}-1{rnd.randint(0, 9)}'
+        else: m = ' '.join(rnd.choice(words) for _ in range(rnd.randint(3, 25)))
+        out.append(m)
+        n += len(m.encode()) + 1
+    return '\n'.join(out)
+
+def _dict_parse(content):
+    # Pre-ChTable representation: one dict per channel, groups hold object lists
+    chs, grps, cur = [], {}, None
+    for ln in content.split('\n'):
+        ln = ln.strip()
+        if ln.startswith('#EXTINF:'):
+            cur = {'name': '', 'group': 'Diger', 'logo': '', 'url': ''}
+            m = GRP_RE.search(ln)
+            if m and m.group(1): cur['group'] = m.group(1).strip()
+            m = LOGO_RE.search(ln)
+            if m: cur['logo'] = m.group(1)
+            m = NAME_RE.search(ln)
+            if m: cur['name'] = m.group(1).strip()
+        elif cur and ln.startswith(('http://', 'https://', 'rtmp://')):
+            cur['url'] = ln
+            chs.append(cur)
+            g = cur['group']
+            if g not in grps: grps[g] = {'chs': [], 'logo': cur['logo'], 'cty': detect_c(g)}
+            grps[g]['chs'].append(cur)
+            cur = None
+    return chs, grps
+
+def _regex_tok(ln):
+    m = GRP_RE.search(ln)
+    grp = m.group(1) if m else ''
+    m = LOGO_RE.search(ln)
+    logo = m.group(1) if m else ''
+    m = NAME_RE.search(ln)
+    return (m.group(1).strip() if m else '', grp, logo)
+
+def _loop_detect(grp):
+    # Pre-classifier detect_c: every code of every country, a fresh regex each
+    if not grp: return 'other'
+    g = grp.lower()
+    for cid, cd in COUNTRIES.items():
+        for code in cd['c']:
+            if g == code or g.startswith(code+' ') or g.startswith(code+'-') or g.endswith(' '+code):
+                return cid
+            if re.search(rf'\b{re.escape(code)}\b', g): return cid
+    return 'other'
+
+def _best(fn, *a, runs=5):
+    # Fastest of several runs, in seconds
+    best = None
+    for _ in range(runs):
+        t = time.perf_counter()
+        fn(*a)
+        t = time.perf_counter() - t
+        best = t if best is None or t < best else best
+    return best
+
+def _retained(fn, *a):
+    # Bytes still allocated after fn returns while its result is kept alive
+    gc.collect()
+    tracemalloc.start()
+    res = fn(*a)
+    gc.collect()
+    cur = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del res
+    return cur
+
+# ==================== BENCHMARKS ====================
+def bench_mem(n=300000):
+    """Retained bytes per channel: dict-per-channel vs ChTable"""
+    n = int(n)
+    txt = synth_m3u(n)
+    old = _retained(_dict_parse, txt)
+    new = _retained(parse_m3u, txt, '', False)
+    print(f'channels      {int(n)}')
+    print(f'dict/channel  {old / n:8.1f} B  ({old / 1e6:.1f} MB)')
+    print(f'ChTable       {new / n:8.1f} B  ({new / 1e6:.1f} MB)')
+    print(f'saved         {100 - new * 100 / old:8.1f} %')
+
+# Lines off the strict fast path; tok_extinf must still agree with the three regexes on them
+MESSY = [
+    '#EXTINF:-1\ttvg-id="a.tr"\ttvg-logo="L"\tgroup-title="G",Tabs',
+    '#EXTINF:-1 tvg-id="a" group-title="G" group-title="H",Dup',
+    '#EXTINF:-1 tvg-id="x"group-title="G" tvg-logo="L",No space',
+    '#EXTINF:-1 tvg-name="a "b" c" group-title="G",Stray quote',
+    '#EXTINF:0 tvg-logo="L" group-title="G" Kanal',
+]
+
+def bench_tok(n=500000):
+    """#EXTINF tokenizing: three regexes vs tok_extinf, over an n-line playlist"""
+    n = int(n)
+    for ln in MESSY:
+        assert tok_extinf(ln)[:3] == _regex_tok(ln), ln
+    ext = [ln for ln in synth_m3u(n // 2).split('\n') if ln.startswith('#EXTINF:')]
+    run = lambda f: [f(ln) for ln in ext]
+    old, new = _best(run, _regex_tok), _best(run, tok_extinf)
+    print(f'lines         {int(n)} ({len(ext)} #EXTINF)')
+    print(f'3 regexes     {old:8.3f} s  {len(ext) / old / 1e3:8.0f} k lines/s')
+    print(f'tok_extinf    {new:8.3f} s  {len(ext) / new / 1e3:8.0f} k lines/s')
+    print(f'speedup       {old / new:8.2f} x')
+
+def bench_par(n=1000000, jobs=os.cpu_count()):
+    """Parse throughput, serial vs 1..jobs worker processes (parallel from the first line)"""
+    n = int(n)
+    txt = synth_m3u(n)
+    ref, raw = parse_m3u(txt, '', False)[0], txt.encode()
+    ser = _best(parse_m3u, txt, '', False, runs=3)
+    print(f'channels      {int(n)} ({len(txt) / 1e6:.0f} MB)')
+    print(f'serial        {ser:8.3f} s  {n / ser / 1e3:8.0f} k ch/s')
+    for w in range(1, int(jobs) + 1):
+        with ProcessPoolExecutor(w) as pool:
+            run = lambda: parse_lines(str_lines(raw), '', pool, 0)
+            tbl = run()[0]
+            assert gen_m3u(tbl) == gen_m3u(ref) and list(tbl.grps) == list(ref.grps)
+            assert all(tbl.grps[g]['cty'] == ref.grps[g]['cty'] for g in ref.grps)
+            t = _best(run, runs=3)
+        print(f'{w:2d} workers    {t:8.3f} s  {n / t / 1e3:8.0f} k ch/s  {ser / t:5.2f} x')
+
+def _group_names(n, seed=1):
+    rnd = random.Random(seed)
+    tags = ('Ulusal', 'Spor', 'HD', 'VOD', 'Sinema', '4K', 'Belgesel', 'Muzik')
+    cs = [c for cs in COUNTRIES.values() for c in cs['c']] + ['XX', 'VIP', 'FHD']
+    return [f'{rnd.choice(cs).upper()}{rnd.choice(": |-")} {rnd.choice(tags)} {i}' for i in range(n)]
+
+def bench_cty(n=50000):
+    """Group classification, uncached: per-code regex loop vs compiled detect_c vs detect_many"""
+    n = int(n)
+    names = _group_names(n)
+    ref = [_loop_detect(g) for g in names]
+    assert [detect_c.__wrapped__(g) for g in names] == ref and detect_many(names) == ref
+    old = _best(lambda: [_loop_detect(g) for g in names], runs=3)
+    one = _best(lambda: [detect_c.__wrapped__(g) for g in names], runs=3)
+    many = _best(detect_many, names, runs=3)
+    print(f'groups        {n}')
+    print(f'code loop     {old:8.3f} s  {n / old / 1e3:8.0f} k/s')
+    print(f'detect_c      {one:8.3f} s  {n / one / 1e3:8.0f} k/s  {old / one:6.1f} x')
+    print(f'detect_many   {many:8.3f} s  {n / many / 1e3:8.0f} k/s  {old / many:6.1f} x')
+
+# ==================== SUITE ====================
+SIZES = {
+    'quick': {'ch': (1000, 100000), 'txt': (1000, 1000000)},
+    'full': {'ch': (1000, 100000, 1000000), 'txt': (1000, 1000000, 50000000)},
+}
+
+def _data(kind, n):
+    # (fn, args, items, bytes) for one suite case; built in the case's own process
+    if kind == 'parse_m3u':
+        txt = synth_m3u(n)
+        return parse_m3u, (txt, '', False), n, len(txt)
+    if kind == 'gen_m3u':
+        tbl = parse_m3u(synth_m3u(n), '', False)[0]
+        return gen_m3u, (tbl,), n, 0
+    if kind == 'dedup':
+        tbl = parse_m3u(synth_m3u(n, dup=0.1), '', False)[0]
+        return dedup, (tbl,), n, 0
+    if kind == 'detect_c':
+        # Uncached matcher over distinct group names (parse sees each group once)
+        names = _group_names(n // 10 or 1, n)
+        return (lambda a: [detect_c.__wrapped__(g) for g in a]), (names,), len(names), 0
+    if kind == 'get_expire':
+        head = synth_m3u(40)[:5000]
+        urls = [f'http://s{i}.example.net/get.php?username=u&password=p&exp={1800000000 + i}' for i in range(n // 10 or 1)]
+        return (lambda a: [get_expire(head, u) for u in a]), (urls,), len(urls), 0
+    if kind == 'extract_links':
+        txt = synth_chat(n)
+        return SmartLinkExtractor.extract_links, (txt,), len(txt), len(txt.encode())
+    raise KeyError(kind)
+
+def _case(kind, n):
+    # One timed + traced case; run in a fresh process so ru_maxrss is its own
+    fn, a, items, nb = _data(kind, n)
+    sec = _best(fn, *a, runs=3 if items <= 100000 else 1)
+    gc.collect()
+    tracemalloc.start()
+    fn(*a)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+    return {'items': items, 'bytes': nb, 'sec': round(sec, 6), 'per_s': round(items / sec, 1),
+            'mb_s': round(nb / sec / 1e6, 2) if nb else None, 'us_per': round(sec * 1e6 / items, 3),
+            'tm_peak': peak, 'rss_kb': rss}
+
+def suite_cases(preset='full'):
+    sz = SIZES[preset]
+    for kind in ('parse_m3u', 'gen_m3u', 'dedup', 'detect_c', 'get_expire'):
+        for n in sz['ch']: yield f'{kind}/{n}', kind, n
+    for n in sz['txt']: yield f'extract_links/{n}', 'extract_links', n
+
+def bench_suite(preset='full', out=None):
+    """Every suite case in its own process; JSON report to out (default stdout)"""
+    res = {'meta': {'preset': preset, 'python': platform.python_version(), 'platform': platform.platform(),
+                    'time': datetime.now().isoformat(timespec='seconds')}, 'cases': {}}
+    for key, kind, n in suite_cases(preset):
+        with ProcessPoolExecutor(1) as pool:
+            r = res['cases'][key] = pool.submit(_case, kind, n).result()
+        print(f'{key:24} {r["sec"]:9.4f} s {r["per_s"]:14.0f} /s {r["us_per"]:10.3f} us {r["tm_peak"] / 1e6:9.1f} MB', file=sys.stderr)
+    js = json.dumps(res, indent=1)
+    if out:
+        with open(out, 'w') as f: f.write(js)
+    else: print(js)
+    return res
+
+def bench_cmp(base, new, tol=10):
+    """Flag cases whose time or traced peak grew more than tol % over the baseline; exit 1 if any"""
+    with open(base) as f: b = json.load(f)['cases']
+    with open(new) as f: c = json.load(f)['cases']
+    tol, bad = 1 + float(tol) / 100, []
+    for k in b:
+        if k not in c:
+            print(f'{k:24} missing')
+            continue
+        ts, ms = c[k]['sec'] / b[k]['sec'], c[k]['tm_peak'] / max(b[k]['tm_peak'], 1)
+        flag = ('TIME ' if ts > tol else '') + ('MEM' if ms > tol else '')
+        if flag: bad.append(k)
+        print(f'{k:24} time {ts:6.2f} x  mem {ms:6.2f} x  {flag or "ok"}')
+    print(f'{len(bad)} regression(s)' if bad else 'no regressions')
+    sys.exit(1 if bad else 0)
+
+BENCHES = {'mem': bench_mem, 'tok': bench_tok, 'par': bench_par, 'cty': bench_cty, 'suite': bench_suite, 'cmp': bench_cmp}
+
+if __name__ == '__main__':
+    name = sys.argv[1] if len(sys.argv) > 1 else 'mem'
+    BENCHES[name](*sys.argv[2:])
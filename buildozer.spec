@@ -4,6 +4,7 @@ package.name = iptveditorpro
 package.domain = com.yengec
 source.dir = .
 source.include_exts = py,png,jpg,kv,atlas
+source.exclude_patterns = bench.py
 version = 1.0.0
 icon.filename = icon.png
 
@@ -0,0 +1,1677 @@
+"""
+IPTV Editor Pro core - everything that does not need Kivy:
+link extraction, HTTP, playlist parsing/writing, link testing, storage.
+"""
+
+import os, io, re, gc, ssl, json, gzip, mmap, queue, shutil, asyncio, sqlite3, hashlib, tempfile, threading, time
+from contextlib import contextmanager
+from array import array
+from datetime import datetime
+from urllib.parse import urlparse, urljoin, urlencode, parse_qs, parse_qsl
+from functools import lru_cache
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from itertools import chain, compress
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.exceptions import NewConnectionError, ConnectTimeoutError, ReadTimeoutError, ProtocolError
+
+# ==================== COUNTRIES ====================
+COUNTRIES = {
+    'turkey': {'n': 'Turkiye', 'f': '🇹🇷', 'c': ['tr', 'tur', 'turkey', 'turkiye', 'turk'], 'p': 1},
+    'germany': {'n': 'Almanya', 'f': '🇩🇪', 'c': ['de', 'ger', 'germany', 'deutsch', 'almanya'], 'p': 2},
+    'austria': {'n': 'Avusturya', 'f': '🇦🇹', 'c': ['at', 'aut', 'austria', 'avusturya', 'osterreich'], 'p': 3},
+    'romania': {'n': 'Romanya', 'f': '🇷🇴', 'c': ['ro', 'rom', 'romania', 'romanya'], 'p': 4},
+    'france': {'n': 'Fransa', 'f': '🇫🇷', 'c': ['fr', 'fra', 'france', 'fransa'], 'p': 5},
+    'italy': {'n': 'Italya', 'f': '🇮🇹', 'c': ['it', 'ita', 'italy', 'italya'], 'p': 6},
+    'spain': {'n': 'Ispanya', 'f': '🇪🇸', 'c': ['es', 'esp', 'spain', 'ispanya'], 'p': 7},
+    'uk': {'n': 'Ingiltere', 'f': '🇬🇧', 'c': ['uk', 'gb', 'england', 'british'], 'p': 8},
+    'usa': {'n': 'Amerika', 'f': '🇺🇸', 'c': ['us', 'usa', 'america', 'amerika'], 'p': 9},
+    'netherlands': {'n': 'Hollanda', 'f': '🇳🇱', 'c': ['nl', 'netherlands', 'holland'], 'p': 10},
+    'poland': {'n': 'Polonya', 'f': '🇵🇱', 'c': ['pl', 'poland', 'polonya'], 'p': 11},
+    'russia': {'n': 'Rusya', 'f': '🇷🇺', 'c': ['ru', 'rus', 'russia', 'rusya'], 'p': 12},
+    'arabic': {'n': 'Arapca', 'f': '🇸🇦', 'c': ['ar', 'ara', 'arabic', 'arab'], 'p': 13},
+    'other': {'n': 'Diger', 'f': '🌐', 'c': ['other'], 'p': 99},
+}
+PRIO_C = ['turkey', 'germany', 'austria', 'romania']
+FMTS = {'m3u': '.m3u', 'm3u8': '.m3u8', 'txt': '.txt'}
+
+# ==================== SMART LINK EXTRACTOR ====================
+class SmartLinkExtractor:
+    """
+    AI-like pattern matching to extract IPTV links from messy text
+    Handles Telegram-style formatted text with emojis and special characters
+    """
+    
+    # IPTV URL patterns
+    URL_PATTERNS = [
+        # Standard m3u links
+        r'(https?://[^\s<>"\']+?/get\.php\?[^\s<>"\']+)',
+        # Live/Movie/Series streams
+        r'(https?://[^\s<>"\']+?/live/[^\s<>"\']+)',
+        r'(https?://[^\s<>"\']+?/movie/[^\s<>"\']+)',
+        r'(https?://[^\s<>"\']+?/series/[^\s<>"\']+)',
+        # Panel links
+        r'(https?://[^\s<>"\']+?/panel_api\.php\?[^\s<>"\']+)',
+        # Player API
+        r'(https?://[^\s<>"\']+?/player_api\.php\?[^\s<>"\']+)',
+        # Direct m3u8/ts
+        r'(https?://[^\s<>"\']+?\.m3u8?(?:\?[^\s<>"\']*)?)',
+        r'(https?://[^\s<>"\']+?\.ts(?:\?[^\s<>"\']*)?)',
+        # Generic IPTV ports (common: 8080, 8000, 80, 25461, 2095, 2082)
+        r'(https?://[^\s<>"\']+?:(?:8080|8000|25461|2095|2082|80)/[^\s<>"\']+)',
+    ]
+    
+    # Patterns to extract username/password from text
+    CREDENTIAL_PATTERNS = [
+        r'[Uu]ser(?:name)?[:\s=]+([A-Za-z0-9_.-]+)',
+        r'👥\s*[^\s]+\s+([A-Za-z0-9_.-]+)',  # 👥 𝕌𝕤𝕖𝕣 username
+        r'[Pp]ass(?:word)?[:\s=]+([A-Za-z0-9_.-]+)',
+        r'🔑\s*[^\s]+\s+([A-Za-z0-9_.-]+)',  # 🔑 ℙ𝕒𝕤𝕤 password
+    ]
+    
+    # Portal/Host patterns
+    PORTAL_PATTERNS = [
+        r'[Pp]ortal[:\s]+\s*(https?://[^\s]+)',
+        r'👀\s*[^\s]+\s+(https?://[^\s]+)',  # 👀 ℙ𝕠𝕣𝕥𝕒𝕝 http://...
+        r'[Hh]ost[:\s]+\s*(https?://[^\s]+)',
+        r'[Ss]erver[:\s]+\s*(https?://[^\s]+)',
+        r'🔰\s*[^\s]+\s+(https?://[^\s]+)',  # 🔰 ℝ𝕖𝕒𝕝 𝕌𝕣𝕝
+    ]
+    
+    @classmethod
+    def extract_links(cls, text):
+        """Extract all IPTV links from text"""
+        links = set()
+        
+        # Method 1: Direct URL extraction
+        for pattern in cls.URL_PATTERNS:
+            matches = re.findall(pattern, text, re.IGNORECASE)
+            for m in matches:
+                url = cls._clean_url(m)
+                if cls._is_valid_iptv_url(url):
+                    links.add(url)
+        
+        # Method 2: Build URLs from portal + credentials
+        portals = []
+        usernames = []
+        passwords = []
+        
+        for pattern in cls.PORTAL_PATTERNS:
+            portals.extend(re.findall(pattern, text, re.IGNORECASE))
+        
+        # Extract usernames
+        user_matches = re.findall(r'[Uu]ser(?:name)?[:\s=]+\s*([A-Za-z0-9_.-]+)', text)
+        usernames.extend(user_matches)
+        user_matches2 = re.findall(r'👥[^A-Za-z0-9]*([A-Za-z0-9_.-]+)', text)
+        usernames.extend(user_matches2)
+        
+        # Extract passwords
+        pass_matches = re.findall(r'[Pp]ass(?:word)?[:\s=]+\s*([A-Za-z0-9_.-]+)', text)
+        passwords.extend(pass_matches)
+        pass_matches2 = re.findall(r'🔑[^A-Za-z0-9]*([A-Za-z0-9_.-]+)', text)
+        passwords.extend(pass_matches2)
+        
+        # Build URLs from combinations
+        for portal in portals:
+            portal = cls._clean_url(portal)
+            if portal:
+                for i, user in enumerate(usernames):
+                    pwd = passwords[i] if i < len(passwords) else ''
+                    if user and pwd:
+                        # Build get.php URL
+                        base = portal.rstrip('/')
+                        if ':' in base.split('/')[-1]:  # Has port
+                            url = f"{base}/get.php?username={user}&password={pwd}&type=m3u_plus"
+                        else:
+                            url = f"{base}:8080/get.php?username={user}&password={pwd}&type=m3u_plus"
+                        links.add(url)
+        
+        # Method 3: Look for M3U emoji patterns (🎬 𝕄𝟛𝕦)
+        m3u_pattern = r'🎬[^h]*(https?://[^\s<>"\']+)'
+        m3u_matches = re.findall(m3u_pattern, text)
+        for m in m3u_matches:
+            url = cls._clean_url(m)
+            if cls._is_valid_iptv_url(url):
+                links.add(url)
+        
+        return list(links)
+    
+    @classmethod
+    def _clean_url(cls, url):
+        """Clean and normalize URL"""
+        if not url:
+            return ''
+        # Remove trailing punctuation
+        url = url.rstrip('.,;:!?)]\'"')
+        # Remove unicode fancy characters around URL
+        url = re.sub(r'[^\x00-\x7F]+$', '', url)
+        return url.strip()
+    
+    @classmethod
+    def _is_valid_iptv_url(cls, url):
+        """Check if URL looks like valid IPTV link"""
+        if not url or not url.startswith('http'):
+            return False
+        # Must have either get.php, live/, or common IPTV patterns
+        iptv_indicators = [
+            'get.php', 'player_api.php', 'panel_api.php',
+            '/live/', '/movie/', '/series/',
+            '.m3u', '.m3u8', '.ts',
+            'username=', 'password=',
+        ]
+        return any(ind in url.lower() for ind in iptv_indicators) or \
+               re.search(r':\d{4,5}/', url)  # Has port number
+    
+    @classmethod
+    def extract_expire_from_text(cls, text):
+        """Extract expiry date from text"""
+        patterns = [
+            r'[Ee]xp(?:ire)?[:\s]+(\d{4}-\d{2}-\d{2})',
+            r'📆\s*[^\d]*(\d{4}-\d{2}-\d{2})',
+            r'[Ee]xp(?:ire)?[:\s]+(\d{2}[./]\d{2}[./]\d{4})',
+        ]
+        for p in patterns:
+            m = re.search(p, text)
+            if m:
+                return m.group(1)
+        return None
+
+# ==================== HTTP ====================
+TEST_JOBS = 16      # default link tests in flight (cfg 'tjobs')
+TEST_PER_HOST = 2   # default link tests in flight per host (cfg 'thost')
+
+def mk_http(conn_retry=True):
+    s = requests.Session()
+    # conn_retry=False: a refused/timed-out connection fails at once and is left to the Breaker
+    r = Retry(total=2, connect=None if conn_retry else False, read=None if conn_retry else False, backoff_factor=0.3, status_forcelist=[500,502,503,504])
+    # One pool per host the tester may have in flight, each big enough for its per-host cap plus a playlist fetch
+    a = HTTPAdapter(max_retries=r, pool_connections=2 * TEST_JOBS, pool_maxsize=2 * TEST_PER_HOST)
+    s.mount('http://', a)
+    s.mount('https://', a)
+    # gzip/deflate always, br when a brotli module is installed; urllib3 decodes them while streaming
+    s.headers.update({'User-Agent': 'VLC/3.0.20 LibVLC/3.0.20', 'Accept': '*/*', 'Accept-Encoding': ACCEPT_ENCODING, 'Connection': 'keep-alive'})
+    return s
+
+http = mk_http()
+thttp = mk_http(False)   # link tests
+
+# Playlist bytes this session: as sent over the wire vs after decompression
+traffic = {'wire': 0, 'body': 0}
+
+def metered(r, size=65536):
+    """Decoded body chunks of a streamed response, adding its wire/body bytes to traffic"""
+    n = 0
+    try:
+        for ch in r.iter_content(size):
+            n += len(ch)
+            yield ch
+    finally:
+        traffic['body'] += n
+        traffic['wire'] += r.raw.tell() if hasattr(r.raw, 'tell') else n
+
+# ==================== PATH HELPERS ====================
+def base_path():
+    try:
+        from android.storage import primary_external_storage_path
+        return os.path.join(primary_external_storage_path(), 'Download')
+    except: return os.path.expanduser('~')
+
+def iptv_folder():
+    p = os.path.join(base_path(), 'IPTV')
+    try: os.makedirs(p, exist_ok=True)
+    except: return base_path()
+    return p
+
+def app_path():
+    try:
+        from android.storage import app_storage_path
+        return app_storage_path()
+    except:
+        p = os.path.join(os.path.expanduser('~'), '.iptv')
+        os.makedirs(p, exist_ok=True)
+        return p
+
+def get_icon():
+    """Get custom app icon from Download folder"""
+    paths = [
+        os.path.join(base_path(), 'icon.png'),
+        os.path.join(base_path(), 'iptv_icon.png'),
+        'icon.png',
+    ]
+    for p in paths:
+        if os.path.exists(p):
+            return p
+    return None
+
+def short_dom(url):
+    try:
+        d = urlparse(url).netloc
+        if not d: return os.path.basename(url).split('.')[0][:18] or 'iptv'
+        if d.startswith('www.'): d = d[4:]
+        p = d.split('.')
+        return '.'.join(p[-2:])[:18] if len(p) > 2 else d[:18]
+    except: return 'iptv'
+
+def gc_(): gc.collect()
+
+# ==================== EXPIRE DETECTION ====================
+def get_expire(content, url):
+    now = datetime.now()
+    try:
+        q = parse_qs(urlparse(url).query)
+        for k in ['exp', 'expires', 'expire', 'e']:
+            if k in q:
+                ts = int(q[k][0])
+                if ts > 1e12: ts //= 1000
+                if 1704067200 < ts < 1893456000:
+                    dt = datetime.fromtimestamp(ts)
+                    if dt > now: return dt.strftime('%d.%m.%Y')
+                    return f'{dt.strftime("%d.%m.%Y")} [EXPIRED]'
+    except: pass
+    for p in [r'[?&]exp[ire]*[s]?=(\d{10,13})', r'"exp[ire]*":\s*(\d{10,13})', r'"exp_date":\s*"?(\d{10,13})']:
+        for m in re.findall(p, (content or '')[:5000], re.I):
+            try:
+                ts = int(m)
+                if ts > 1e12: ts //= 1000
+                if 1704067200 < ts < 1893456000:
+                    dt = datetime.fromtimestamp(ts)
+                    if dt > now: return dt.strftime('%d.%m.%Y')
+                    return f'{dt.strftime("%d.%m.%Y")} [EXPIRED]'
+            except: pass
+    return ''
+
+# ==================== COUNTRY DETECTION ====================
+# A group belongs to the first country (COUNTRIES order) one of whose codes
+# appears in it as a whole word; codes are plain words, so one alternation
+# finds every candidate and the lowest rank wins.
+def _c_rank():
+    rk = {}
+    for i, (cid, cd) in enumerate(COUNTRIES.items()):
+        for c in cd['c']: rk.setdefault(c, (i, cid))
+    return rk
+
+C_RANK = _c_rank()   # code -> (rank, country id)
+C_RE = re.compile(r'\b(?:' + '|'.join(sorted(C_RANK, key=len, reverse=True)) + r')\b')
+
+@lru_cache(1 << 16)
+def detect_c(grp):
+    if not grp: return 'other'
+    return min(map(C_RANK.__getitem__, C_RE.findall(grp.lower())), default=(0, 'other'))[1]
+
+def _by_line(rx, txt):
+    # (line number, match) for every match of rx in newline-joined txt
+    ln = pos = 0
+    for m in rx.finditer(txt):
+        ln += txt.count('\n', pos, m.start())
+        pos = m.start()
+        yield ln, m
+
+def detect_many(grps):
+    """detect_c over a list of names in one regex pass: names are joined on newlines and matches are binned by line"""
+    best = [None] * len(grps)
+    txt = '\n'.join(grps).lower()
+    if txt.count('\n') != len(grps) - 1:
+        return [detect_c(g) for g in grps]   # a name with its own newline would shift the lines
+    for ln, m in _by_line(C_RE, txt):
+        r = C_RANK[m.group()]
+        if best[ln] is None or r < best[ln]: best[ln] = r
+    return [b[1] if b else 'other' for b in best]
+
+# Channel level: a country prefix on the name ('TR: TRT 1', '[DE] ZDF') beats
+# a country suffix on tvg-id ('trt1.tr'), which beats the group's country.
+CIDS = list(COUNTRIES)
+CIDX = {c: i for i, c in enumerate(CIDS)}
+TLD_C = {'tr': 'turkey', 'de': 'germany', 'at': 'austria', 'ro': 'romania', 'fr': 'france', 'it': 'italy', 'es': 'spain', 'uk': 'uk',
+         'gb': 'uk', 'us': 'usa', 'nl': 'netherlands', 'pl': 'poland', 'ru': 'russia', 'sa': 'arabic', 'ae': 'arabic'}
+PFX_RE = re.compile(r'^[^\w\n]*(' + '|'.join(sorted(C_RANK, key=len, reverse=True)) + r')[ \t]*[:|\])-]', re.M)
+TVG_RE = re.compile(r'tvg-id="[^"\n]*\.((?i:' + '|'.join(TLD_C) + r'))"')
+
+def chan_cty(chs):
+    """
+    Country of every row of a ChTable as a bytearray of CIDS indices, in
+    three batched passes (group lookup, then one regex over all tvg-ids,
+    then one over all names) instead of a classifier call per channel.
+    """
+    gc = [CIDX[chs.grps[g]['cty']] for g in chs.gnames]
+    cc = bytearray(map(gc.__getitem__, chs.gid))
+    for ln, m in _by_line(TVG_RE, '\n'.join(chs.ex)): cc[ln] = CIDX[TLD_C[m.group(1).lower()]]
+    for ln, m in _by_line(PFX_RE, '\n'.join(chs.name).lower()): cc[ln] = C_RANK[m.group(1)][0]
+    return cc
+
+def cc_group(chs, cc=None):
+    """Group name of row i as exported: "<country> | <group>" when its chan_cty country (cc) differs from its group's"""
+    if cc is None: return chs.group
+    gc = [CIDX[chs.grps[g]['cty']] for g in chs.gnames]
+    def group(i):
+        g = chs.group(i)
+        return g if cc[i] == gc[chs.gid[i]] else f"{COUNTRIES[CIDS[cc[i]]]['n']} | {g}"
+    return group
+
+def pick_cty(cc, ctrs):
+    """Row indices whose chan_cty country is in ctrs"""
+    keep = bytearray(256)
+    for c in ctrs:
+        if c in CIDX: keep[CIDX[c]] = 1
+    return array('I', compress(range(len(cc)), cc.translate(keep)))
+
+# ==================== CHANNEL TABLE ====================
+class ChTable:
+    """
+    Columnar channel store: one row per channel spread over parallel
+    lists/arrays. Group names and logo URLs are interned, so each distinct
+    value is kept once and a row only pays for two array slots.
+    ex keeps each row's other #EXTINF attributes verbatim; opt (sparse)
+    its #EXTVLCOPT-style lines. grps maps group name -> {'ix': row
+    indices, 'logo', 'cty'}.
+    With dup=True a row whose URL was already added is dropped on the way
+    in (first one wins) and counted in ndup.
+    """
+    __slots__ = ('name', 'url', 'ex', 'opt', 'gid', 'lid', 'gnames', 'logos', 'grps', '_gi', '_li', 'seen', 'ndup')
+    
+    def __init__(s, dup=False):
+        s.name, s.url, s.ex, s.opt = [], [], [], {}
+        s.gid, s.lid = array('I'), array('I')
+        s.gnames, s.logos = [], ['']
+        s.grps, s._gi, s._li = {}, {}, {'': 0}
+        s.seen, s.ndup = set() if dup else None, 0
+    
+    def __len__(s): return len(s.url)
+    
+    def _new_group(s, group, logo):
+        gi = s._gi[group] = len(s.gnames)
+        s.gnames.append(group)
+        s.grps[group] = {'ix': array('I'), 'logo': logo, 'cty': detect_c(group)}
+        return gi
+    
+    def _new_logo(s, logo):
+        li = s._li[logo] = len(s.logos)
+        s.logos.append(logo)
+        return li
+    
+    def add(s, name, group, logo, url, ex='', opt=''):
+        if s.seen is not None:
+            if url in s.seen:
+                s.ndup += 1
+                return -1
+            s.seen.add(url)
+        gi = s._gi.get(group)
+        if gi is None: gi = s._new_group(group, logo)
+        li = s._li.get(logo)
+        if li is None: li = s._new_logo(logo)
+        i = len(s.url)
+        s.name.append(name)
+        s.url.append(url)
+        s.ex.append(ex)
+        if opt: s.opt[i] = opt
+        s.gid.append(gi)
+        s.lid.append(li)
+        s.grps[group]['ix'].append(i)
+        return i
+    
+    def merge(s, t):
+        """Append every row of t, remapping its group/logo ids; same result as re-adding them"""
+        if s.seen is not None:
+            s.ndup += t.ndup
+            if not s.seen.isdisjoint(t.url):
+                u = ChTable(True)
+                u.seen = s.seen
+                for i in range(len(t)): u.add(*t.fields(i))
+                s.ndup += u.ndup
+                t = u
+            else: s.seen.update(t.url)
+        off = len(s.url)
+        gm = [s._gi[g] if g in s._gi else s._new_group(g, t.grps[g]['logo']) for g in t.gnames]
+        lm = [s._li[l] if l in s._li else s._new_logo(l) for l in t.logos]
+        s.name += t.name
+        s.url += t.url
+        s.ex += t.ex
+        for i, o in t.opt.items(): s.opt[i + off] = o
+        s.gid.extend(gm[g] for g in t.gid)
+        s.lid.extend(lm[l] for l in t.lid)
+        for g, gd in t.grps.items():
+            s.grps[g]['ix'].extend(i + off for i in gd['ix'])
+    
+    def group(s, i): return s.gnames[s.gid[i]]
+    def logo(s, i): return s.logos[s.lid[i]]
+    
+    def fields(s, i):
+        """Row i as ChTable.add arguments"""
+        return s.name[i], s.group(i), s.logo(i), s.url[i], s.ex[i], s.opt.get(i, '')
+    
+    def attrs(s, i):
+        """Every #EXTINF attribute of row i as a dict"""
+        d = split_attrs(s.ex[i])
+        if s.lid[i]: d['tvg-logo'] = s.logo(i)
+        d['group-title'] = s.group(i)
+        return d
+    
+    def row(s, i):
+        return {'name': s.name[i], 'group': s.group(i), 'logo': s.logo(i), 'url': s.url[i], 'attrs': s.attrs(i)}
+    
+    def sub(s, ix):
+        """New table of rows ix only, so the rest can be freed"""
+        t = ChTable()
+        for i in ix: t.add(*s.fields(i))
+        return t
+    
+    def pick(s, groups):
+        """Row indices of the given groups, group by group"""
+        ix = array('I')
+        for g in groups:
+            if g in s.grps: ix.extend(s.grps[g]['ix'])
+        return ix
+
+# ==================== M3U PARSER ====================
+# One possessive (no backtracking) match per #EXTINF line. group-title and
+# tvg-logo are captured on their own; every other attribute is captured
+# verbatim, with its leading space or tab, in the runs before/between/after them.
+_XA = r'(?:[ \t]++(?!group-title=|tvg-logo=)[^=", \t]++=(?:"[^"]*+"|[^", \t]*+))*+'
+_CA = r'(?:[ \t]++(?:group-title="([^"]*+)"|tvg-logo="([^"]*+)"))?+'
+EXTINF_RE = re.compile(rf'#EXTINF:[-+\d.]*+({_XA}){_CA}({_XA}){_CA}({_XA})[^,]*+, *+(.*)')
+ATTR_RE = re.compile(r'([^=",\s]+)=(?:"([^"]*)"|([^",\s]*))')
+# Tolerant path: attribute section up to the first unquoted comma, group/logo found anywhere in it
+LOOSE_RE = re.compile(r'#EXTINF:[-+\d.]*((?:"[^"]*"|[^",])*)')
+LOOSE_GL = re.compile(r'\s*(?:group-title="([^"]*)"|tvg-logo="([^"]*)")')
+OPT_TAGS = (b'#EXTGRP:', b'#EXTVLCOPT:', b'#KODIPROP:', b'#EXTHTTP:')
+
+def tok_extinf(ln):
+    """
+    Tokenize a stripped #EXTINF line in a single scan -> (name, group,
+    logo, ex). ex holds the remaining attributes exactly as written
+    (leading space included), so export can write them back;
+    split_attrs() reads them. Lines the strict scan cannot consume fully
+    (no comma, attributes without a space between them, stray quotes, a
+    repeated group-title/tvg-logo) go through _tok_loose, which loses
+    nothing either.
+    """
+    m = EXTINF_RE.match(ln)
+    if not m or ln[m.end(7)] != ',': return _tok_loose(ln)
+    e1, g, l, e2, g2, l2, e3, name = m.groups()
+    if (g is not None and g2 is not None) or (l is not None and l2 is not None): return _tok_loose(ln)
+    return name, g or g2 or '', l or l2 or '', e1 + e2 + e3
+
+def _tok_loose(ln):
+    # first group-title/tvg-logo searched anywhere in the attribute section, the rest of it (repeats too) kept verbatim in ex
+    m = LOOSE_RE.match(ln)
+    if not m: return '', '', '', ''
+    end = m.end(1)
+    if end < len(ln) and ln[end] != ',': end = ln.rfind(',')   # unbalanced quote: last comma, as a plain search would
+    if end < m.start(1): attrs, name = ln[m.start(1):], ''
+    else: attrs, name = ln[m.start(1):end], ln[end + 1:].strip()
+    g = l = None
+    ex, pos = [], 0
+    for a in LOOSE_GL.finditer(attrs):
+        if a.group(1) is not None:
+            if g is not None: continue
+            g = a.group(1)
+        elif l is not None: continue
+        else: l = a.group(2)
+        ex.append(attrs[pos:a.start()])
+        pos = a.end()
+    ex = (''.join(ex) + attrs[pos:]).rstrip()
+    if ex and not ex[0].isspace(): ex = ' ' + ex
+    return name, g or '', l or '', ex
+
+def split_attrs(ex):
+    return {k: q or u for k, q, u in ATTR_RE.findall(ex)}
+
+def _dec(b): return b.decode('utf-8', errors='ignore')
+
+def iter_m3u(lines):
+    """
+    Yield (name, group, logo, url, ex, opt) one by one from an iterable of
+    playlist lines as bytes. Only the lines of an entry are decoded; headers,
+    comments and blank lines never are. opt collects #EXTGRP/#EXTVLCOPT/...
+    lines of the entry.
+    """
+    cur = None
+    for ln in lines:
+        ln = ln.strip()
+        if ln.startswith(b'#EXTINF:'):
+            name, grp, logo, ex = tok_extinf(_dec(ln))
+            cur, opt = (name, grp.strip() or 'Diger', logo), ''
+        elif cur and ln.startswith((b'http://', b'https://', b'rtmp://')):
+            yield cur + (_dec(ln), ex, opt)
+            cur = None
+        elif cur and ln.startswith(OPT_TAGS):
+            opt = f'{opt}\n{_dec(ln)}' if opt else _dec(ln)
+
+def str_lines(content):
+    """Split a str or bytes on newlines lazily, without building a list"""
+    sep, i = '\n' if isinstance(content, str) else b'\n', 0
+    while True:
+        j = content.find(sep, i)
+        if j < 0:
+            yield content[i:]
+            return
+        yield content[i:j]
+        i = j + 1
+
+def chunk_lines(chunks):
+    """Byte lines from an iterable of byte chunks; at most one partial line is held"""
+    pend = b''
+    for ch in chunks:
+        if pend: ch = pend + ch
+        ls = ch.split(b'\n')
+        pend = ls.pop()
+        yield from ls
+    if pend: yield pend
+
+def resp_lines(r, size=65536):
+    """Byte lines of a streamed response; only one chunk is held at a time"""
+    return chunk_lines(metered(r, size))
+
+def _head(lines, buf, n=5000):
+    # Pass lines through, keeping the first n bytes for get_expire
+    for ln in lines:
+        if n > 0:
+            buf.append(ln[:n])
+            n -= len(ln) + 1
+        yield ln
+
+def _until(lines, n, rest):
+    # Yield lines until ~n bytes have passed and an entry starts; stash that line in rest
+    for ln in lines:
+        if n <= 0 and ln.lstrip().startswith(b'#EXTINF:'):
+            rest.append(ln)
+            return
+        n -= len(ln) + 1
+        yield ln
+
+def _blocks(lines, size):
+    # '\n'-joined blocks of ~size bytes, cut only right before an #EXTINF line
+    buf, n = [], 0
+    for ln in lines:
+        if n >= size and ln.lstrip().startswith(b'#EXTINF:'):
+            yield b'\n'.join(buf)
+            buf, n = [], 0
+        buf.append(ln)
+        n += len(ln) + 1
+    if buf: yield b'\n'.join(buf)
+
+def _parse_block(text, dup=False):
+    # Worker-process side of the parallel parse
+    tbl = ChTable(dup)
+    for c in iter_m3u(str_lines(text)):
+        tbl.add(*c)
+    return tbl
+
+PAR_MIN = 32 << 20    # bytes parsed in-process before handing the rest to workers
+PAR_BLOCK = 4 << 20   # bytes per worker block
+_pool = None
+
+def par_pool():
+    """Shared worker-process pool (cfg 'pjobs', 0 = all cores); None where unusable, e.g. Android"""
+    global _pool
+    if _pool is None:
+        n = int(db.get('pjobs', '0')) or os.cpu_count() or 1
+        try:
+            if n < 2 or 'ANDROID_ARGUMENT' in os.environ: raise OSError('no worker processes')
+            _pool = ProcessPoolExecutor(n)
+        except (OSError, ImportError, NotImplementedError):
+            _pool = False
+    return _pool or None
+
+def parse_lines(lines, url='', pool=None, par_min=PAR_MIN, dup=False):
+    """
+    Parse playlist byte lines into (ChTable, grps, expire). Past par_min bytes the
+    remaining lines are cut into #EXTINF-aligned blocks and parsed in pool
+    (default par_pool(); False = stay serial), with at most two blocks per
+    worker in flight. Blocks are merged in order, so the result is identical
+    to a serial parse. dup drops repeated URLs while parsing (see ChTable).
+    """
+    tbl, head, rest = ChTable(dup), [], []
+    if pool is None: pool = par_pool()
+    lines = _head(lines, head)
+    for c in iter_m3u(_until(lines, par_min, rest) if pool else lines):
+        tbl.add(*c)
+    if rest:
+        q, cap = deque(), 2 * pool._max_workers
+        for b in _blocks(chain(rest, lines), PAR_BLOCK):
+            q.append(pool.submit(_parse_block, b, dup))
+            if len(q) >= cap: tbl.merge(q.popleft().result())
+        while q: tbl.merge(q.popleft().result())
+    return tbl, tbl.grps, get_expire(_dec(b'\n'.join(head)), url)
+
+def parse_m3u(content, url='', pool=None, dup=False):
+    """Parse a whole playlist held as str (encoded once) or bytes"""
+    if isinstance(content, str): content = content.encode()
+    return parse_lines(str_lines(content), url, pool, dup=dup)
+
+def load_m3u(path, dup=False):
+    """
+    Parse a local playlist file. Plain files are memory-mapped and split one
+    1 MB window at a time, so only the pages the parser reaches are read and
+    the file is never copied whole; .gz files are streamed through gzip.
+    """
+    with open(path, 'rb') as f:
+        if path.endswith('.gz'):
+            with gzip.GzipFile(fileobj=f) as z:
+                return parse_lines(chunk_lines(iter(lambda: z.read(65536), b'')), dup=dup)
+        if not os.fstat(f.fileno()).st_size:
+            return parse_lines(iter(()), dup=dup)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            try: mm.madvise(mmap.MADV_SEQUENTIAL)
+            except (AttributeError, OSError): pass
+            return parse_lines(chunk_lines(mm[i:i + (1 << 20)] for i in range(0, len(mm), 1 << 20)), dup=dup)
+
+def fetch_m3u(url, timeout=30, dup=False):
+    """Download and parse a playlist incrementally, the body is never held whole; one a deep test already read (bodies) is not downloaded again"""
+    b = bodies.get(url)
+    if b: return parse_m3u(b, url, dup=dup)
+    with plcache.lines(url, timeout) as lines:
+        return parse_lines(lines, url, dup=dup)
+
+PIPE_JOBS = 6    # default playlists downloaded and parsed at once (cfg 'fjobs')
+PIPE_DEPTH = 4   # finished playlists waiting for the consumer at most
+
+def fetch_many(urls, fn=fetch_m3u, jobs=None, depth=PIPE_DEPTH, stop=None, per_host=None):
+    """
+    Fetch stage of a download -> parse -> write pipeline: jobs threads run
+    fn(url) (fetch_m3u streams and parses as it downloads) and (url, result
+    or exception) pairs are yielded in completion order. At most per_host
+    URLs of one host are in flight (cfg 'thost', as in test_links) and
+    hosts take turns. At most depth results wait in the queue, so a slow
+    consumer holds the fetchers back instead of piling parsed tables up
+    in memory. Once stop() is true no new URL is started.
+    """
+    jobs = jobs or int(db.get('fjobs', str(PIPE_JOBS)))
+    per_host = per_host or int(db.get('thost', str(TEST_PER_HOST)))
+    q, busy, out, cv = OrderedDict(), {}, queue.Queue(depth), threading.Condition()
+    for u in urls: q.setdefault(urlparse(u).netloc.lower(), deque()).append(u)
+    def take():
+        with cv:
+            while q and not (stop and stop()):
+                for h in q:
+                    if busy.get(h, 0) < per_host:
+                        u = q[h].popleft()
+                        if q[h]: q.move_to_end(h)
+                        else: del q[h]
+                        busy[h] = busy.get(h, 0) + 1
+                        return u, h
+                cv.wait(0.5)
+    def work():
+        try:
+            for u, h in iter(take, None):
+                try: res = fn(u)
+                except Exception as e: res = e
+                with cv:
+                    busy[h] -= 1
+                    cv.notify_all()
+                out.put((u, res))
+        finally: out.put(None)
+    n = min(jobs, sum(len(d) for d in q.values()))
+    for _ in range(n): threading.Thread(target=work, daemon=True).start()
+    while n:
+        v = out.get()
+        if v is None: n -= 1
+        else: yield v
+
+def m3u_lines(chs, ix=None, cc=None):
+    """
+    Yield the playlist for rows ix (default: all) line by line, newline
+    included. With cc (chan_cty) a row whose own country differs from its
+    group's is written under "<country> | <group>".
+    """
+    yield '#EXTM3U\n'
+    opt, group = chs.opt, cc_group(chs, cc)
+    for i in (range(len(chs)) if ix is None else ix):
+        ex, logo, grp = chs.ex[i], chs.logo(i), group(i)
+        ext = (f' tvg-logo="{logo}"' if logo else '') + (f' group-title="{grp}"' if grp else '')
+        # repeated group-title/tvg-logo kept in ex go after ours, so a re-read picks ours first again
+        ext = ext + ex if 'group-title=' in ex or 'tvg-logo=' in ex else ex + ext
+        yield f'#EXTINF:-1{ext},{chs.name[i]}\n'
+        if i in opt: yield opt[i] + '\n'
+        yield chs.url[i] + '\n'
+
+def gen_m3u(chs, ix=None, cc=None):
+    return ''.join(m3u_lines(chs, ix, cc))
+
+GZ_LEVEL = 5   # gzip level for exports and cached bodies: most of level 9's ratio at a fraction of the CPU
+
+def out_ext(fmt):
+    """Export file extension for fmt, plus .gz when cfg 'gz' is on"""
+    return FMTS.get(fmt, '.m3u8') + ('.gz' if db.get('gz', 'false') == 'true' else '')
+
+PART_AGE = 3600   # s: a .*.part temp file this old was left by a killed write
+_UMASK = os.umask(0); os.umask(_UMASK)   # read once: os.umask can only be read by setting it
+
+def _sweep_parts(d):
+    # Remove temp files of writes that never finished
+    now = time.time()
+    try:
+        for e in os.scandir(d):
+            if e.name.startswith('.') and e.name.endswith('.part') and now - e.stat().st_mtime > PART_AGE:
+                os.remove(e.path)
+    except OSError: pass
+
+def write_m3u(path, chs, ix=None, cc=None):
+    """
+    Stream rows straight to a temp file next to path, then rename it into
+    place: memory stays flat and a killed app never leaves a half-written
+    playlist under the real name (its leftover temp is swept by a later
+    write). The file gets the usual umask mode, not mkstemp's 0600. A path
+    ending in .gz is gzip-compressed. cc as in m3u_lines. Returns the
+    bytes written to disk.
+    """
+    d = os.path.dirname(path) or '.'
+    _sweep_parts(d)
+    fd, tmp = tempfile.mkstemp(prefix='.', suffix='.part', dir=d)
+    try:
+        with os.fdopen(fd, 'wb', buffering=1 << 16) as raw:
+            z = gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=GZ_LEVEL, mtime=0) if path.endswith('.gz') else None
+            f = io.TextIOWrapper(z or raw, encoding='utf-8')
+            f.writelines(m3u_lines(chs, ix, cc))
+            f.flush()
+            f.detach()
+            if z: z.close()
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.chmod(tmp, 0o666 & ~_UMASK)
+        os.replace(tmp, path)
+    except BaseException:
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
+    return os.path.getsize(path)
+
+# ==================== LINK TESTING ====================
+PROBE_MAX = 50000   # deep test: most body bytes read
+PROBE_N = 20        # deep test: entries after an #EXTM3U header that end the read early
+PROBE_HDR = {'Range': f'bytes=0-{PROBE_MAX - 1}', 'Accept-Encoding': 'identity'}
+PAIR_RB = re.compile(rb'#EXTINF:[^\n]*\n(?:[ \t\r]*(?:#[^\n]*)?\n)*[ \t]*(?:https?|rtmp)://')
+
+class Probe:
+    """
+    Deep-test body reader. Chunks go into one bytearray; reading stops after
+    PROBE_MAX bytes or as soon as an #EXTM3U header and PROBE_N #EXTINF
+    entries are in, unless sized() saw that the whole body fits, in which
+    case it is read to the end and can be kept (bodies). Requests ask for
+    that range uncompressed, so the server's total size gives a channel
+    estimate.
+    """
+    __slots__ = ('buf', 'n', 'pos', 'fits')
+    
+    def __init__(s): s.buf, s.n, s.pos, s.fits = bytearray(), 0, 0, False
+    
+    @staticmethod
+    def total(code, hdr):
+        """Full body size from the response headers, 0 if unknown"""
+        cr = hdr.get('content-range', '').rpartition('/')[2]
+        return int(cr) if cr.isdigit() else int(hdr.get('content-length') or 0) if code == 200 else 0
+    
+    def sized(s, code, hdr):
+        """Call with the response headers before feeding"""
+        s.fits = 0 < s.total(code, hdr) <= PROBE_MAX
+    
+    def feed(s, ch):
+        """Add a chunk; True once enough has been read"""
+        b = s.buf
+        b += ch
+        s.n += b.count(b'#EXTINF', s.pos)
+        s.pos = max(0, len(b) - 6)
+        return len(b) >= PROBE_MAX or not s.fits and s.n > PROBE_N and b[:64].lstrip(b'\xef\xbb\xbf \t\r\n').startswith(b'#EXTM3U')
+    
+    def whole(s, code, hdr, eof):
+        """True if buf is the entire body"""
+        tot = s.total(code, hdr)
+        return tot <= len(s.buf) if tot else eof and code == 200
+    
+    def verdict(s, code, hdr, eof):
+        """(ok, msg) from what was read; eof = the loop ran out of body, not out of patience"""
+        b = s.buf
+        if len(b) < 50: return False, "Empty"
+        if not s.n: return (True, "Stream") if len(b) > 3000 else (False, "Invalid")
+        n = len(PAIR_RB.findall(b))
+        if not n: return False, "No ch"
+        tot = s.total(code, hdr)
+        if s.whole(code, hdr, eof): return True, f"{n} ch"
+        if tot: return True, f"~{tot * n // len(b)} ch"
+        return True, f"{n}+ ch"
+
+BODY_MEM = 16 << 20   # kept playlist bodies held in memory before the rest spill to disk
+
+class Bodies:
+    """
+    Session store of playlists that a deep test read whole, keyed by URL,
+    so fetch_m3u can parse them without downloading them again. Up to
+    BODY_MEM bytes stay in memory, later ones go to a temp directory; all
+    of it is dropped by clear() (app exit).
+    """
+    def __init__(s, mem=BODY_MEM):
+        s.mem, s.used, s.d, s.dir, s.lk = mem, 0, {}, None, threading.Lock()
+    
+    def keep(s, url, p, code, hdr, eof):
+        """p.verdict(...) of a deep test, storing p's body when it is a whole playlist"""
+        v = p.verdict(code, hdr, eof)
+        if v[0] and p.n and p.whole(code, hdr, eof): s.put(url, bytes(p.buf))
+        return v
+    
+    def put(s, url, body):
+        with s.lk:
+            if url in s.d: return
+            if s.used + len(body) <= s.mem:
+                s.d[url], s.used = body, s.used + len(body)
+                return
+            if not s.dir: s.dir = tempfile.mkdtemp(prefix='iptv-bodies-')
+            fp = os.path.join(s.dir, hashlib.md5(url.encode()).hexdigest())
+            with open(fp, 'wb') as f: f.write(body)
+            s.d[url] = fp
+    
+    def get(s, url):
+        v = s.d.get(url)
+        if isinstance(v, str):
+            try:
+                with open(v, 'rb') as f: return f.read()
+            except OSError: return None
+        return v
+    
+    def clear(s):
+        with s.lk:
+            s.d, s.used = {}, 0
+            if s.dir: shutil.rmtree(s.dir, ignore_errors=True)
+            s.dir = None
+
+bodies = Bodies()
+
+BRK_K = 3       # consecutive dead-host results that open a host's breaker
+BRK_COOL = 60   # seconds an open breaker fails links fast
+DEAD = ('Timeout', 'No conn')
+HOST_DOWN = (False, "Host down")
+
+class Breaker:
+    """
+    Per-host circuit breaker for link tests. BRK_K timeouts/connection
+    failures in a row open a host: its links fail fast for BRK_COOL s.
+    Then one trial goes through (half-open); reaching the host closes the
+    breaker, another failure re-opens it. on(host, state) is called on
+    every open/close, e.g. to log it.
+    """
+    def __init__(s, k=BRK_K, cool=BRK_COOL):
+        s.k, s.cool, s.st, s.lk, s.on = k, cool, {}, threading.Lock(), None
+    
+    def allow(s, h):
+        with s.lk:
+            e = s.st.get(h)
+            if not e or e[1] == 0: return True
+            if e[2] or time.time() < e[1]: return False
+            e[2] = True
+            return True
+    
+    def record(s, h, alive):
+        with s.lk:
+            e = s.st.setdefault(h, [0, 0, False])
+            was, trial = e[1] > 0, e[2]
+            if alive:
+                s.st.pop(h)
+                ev = 'closed' if was else None
+            else:
+                e[0] += 1
+                e[2] = False
+                ev = None
+                if trial or e[0] >= s.k and not was:
+                    e[1] = time.time() + s.cool
+                    ev = 'open'
+        if ev and s.on: s.on(h, ev)
+    
+    def clear(s):
+        with s.lk: s.st.clear()
+
+breaker = Breaker()
+
+LAT_EDGES = [0.05 * 1.5 ** i for i in range(20)]   # histogram bucket bounds, 50 ms .. ~110 s
+LAT_FLOOR = 2.0   # no adaptive timeout goes below this (s)
+LAT_MIN = 5       # samples a host needs before its read timeout adapts
+LAT_GMIN = 20     # samples across all hosts before the connect timeout adapts
+
+class Latency:
+    """
+    Response-header latency histograms (log-spaced buckets), per host and
+    global. timeouts() turns them into (connect, read) timeouts under the
+    user's ceiling: connect from the global histogram, since connect time
+    barely depends on the host and dead panels fail there; read from the
+    host's own, so a slow but alive host keeps its headroom. Timed-out tests
+    are added at the ceiling to the host only (test_link), so a slow host's
+    percentiles grow without dragging every other host's connect timeout.
+    """
+    def __init__(s):
+        s.h, s.g, s.lk = {}, array('I', [0] * (len(LAT_EDGES) + 1)), threading.Lock()
+    
+    def add(s, h, sec, glob=True):
+        i = bisect_left(LAT_EDGES, sec)
+        with s.lk:
+            a = s.h.get(h)
+            if a is None: a = s.h[h] = array('I', [0] * (len(LAT_EDGES) + 1))
+            a[i] += 1
+            if glob: s.g[i] += 1
+    
+    def pct(s, h, q):
+        """q-quantile latency for host h (None: all hosts) in seconds, None without enough samples"""
+        a = s.g if h is None else s.h.get(h)
+        n = sum(a) if a else 0
+        if n < (LAT_GMIN if h is None else LAT_MIN): return None
+        c = 0
+        for i, k in enumerate(a):
+            c += k
+            if c >= q * n: break
+        return LAT_EDGES[min(i, len(LAT_EDGES) - 1)]
+    
+    def timeouts(s, h, ceil):
+        g, p99 = s.pct(None, .95), s.pct(h, .99)
+        return (ceil if g is None else min(ceil, max(LAT_FLOOR, 2 * g)),
+                ceil if p99 is None else min(ceil, max(LAT_FLOOR, 3 * p99)))
+
+lat = Latency()
+thttp.hooks['response'].append(lambda r, *a, **k: lat.add(_host(r.url), r.elapsed.total_seconds()))
+_hx = ThreadPoolExecutor(2 * TEST_JOBS)   # hedged attempts
+
+def _hedged(fn, url, mode, to, after):
+    # fn once; if it has not finished after `after` s, a second copy too; first success wins, else the last failure
+    a = _hx.submit(fn, url, mode, to)
+    if wait([a], timeout=after)[0]: return a.result()
+    pend = {a, _hx.submit(fn, url, mode, to)}
+    while pend:
+        done, pend = wait(pend, return_when=FIRST_COMPLETED)
+        for f in done:
+            res = f.result()
+            if res[0]: return res
+    return res
+
+def _tkey(url, mode): return hashlib.md5(f'{mode} {url}'.encode()).hexdigest()
+
+def _host(url): return urlparse(url).netloc.lower()
+
+def test_link(url, mode='deep', timeout=12):
+    """
+    (ok, msg) for url; answered from the result store (DB.lt_get) while
+    fresh, failed fast while its host's breaker is open. timeout is the
+    ceiling for the adaptive (connect, read) timeouts; with cfg 'hedge' a
+    probe still running past the host's p95 gets a second copy.
+    """
+    k = _tkey(url, mode)
+    v = db.lt_get(k)
+    if v: return v
+    h = _host(url)
+    if not breaker.allow(h): return HOST_DOWN
+    t, to, p95 = time.perf_counter(), lat.timeouts(h, timeout), lat.pct(h, .95)
+    if p95 and db.get('hedge', 'false') == 'true': result = _hedged(_probe, url, mode, to, p95)
+    else: result = _probe(url, mode, to)
+    if result[1] == 'Timeout': lat.add(h, timeout, False)
+    breaker.record(h, result[1] not in DEAD)
+    db.lt_put(k, result, time.perf_counter() - t, h)
+    return result
+
+def xtream_api(url):
+    """player_api.php URL for an Xtream get.php link, else None"""
+    u = urlparse(url)
+    if not u.path.endswith('/get.php'): return None
+    q = parse_qs(u.query)
+    if 'username' not in q or 'password' not in q: return None
+    return f"{u.scheme}://{u.netloc}{u.path[:-7]}player_api.php?{urlencode({'username': q['username'][0], 'password': q['password'][0]})}"
+
+def xtream_verdict(body, url):
+    """(ok, msg) from a player_api.php answer; None if it is not one"""
+    try: ui = json.loads(bytes(body))['user_info']
+    except (ValueError, KeyError, TypeError): return None
+    if not isinstance(ui, dict): return None
+    if str(ui.get('auth', 1)) != '1': return False, "Auth failed"
+    st = ui.get('status') or 'Active'
+    exp = get_expire(bytes(body).decode('utf-8', errors='ignore'), url) or 'Unlimited'
+    if 'EXPIRED' in exp: return False, exp.replace(' [EXPIRED]', ' expired')
+    if st != 'Active': return False, st
+    return True, f"{exp} {ui.get('active_cons', 0)}/{ui.get('max_connections', '?')} con"
+
+def _probe(url, mode, timeout):
+    try:
+        api = xtream_api(url) if mode == 'api' else None
+        if api:
+            with thttp.get(api, timeout=timeout, stream=True) as r:
+                p = Probe()
+                if r.status_code == 200:
+                    for ch in r.iter_content(8192):
+                        if p.feed(ch): break
+                v = xtream_verdict(p.buf, url) if p.buf else None
+            if v: return v
+        if mode == 'quick':
+            r = thttp.head(url, timeout=timeout, allow_redirects=True)
+            return r.status_code == 200, f"HTTP {r.status_code}"
+        else:
+            with thttp.get(url, timeout=timeout, stream=True, headers=PROBE_HDR) as r:
+                if r.status_code not in (200, 206):
+                    return False, f"HTTP {r.status_code}"
+                p, eof = Probe(), True
+                p.sized(r.status_code, r.headers)
+                for ch in r.iter_content(8192):
+                    if p.feed(ch):
+                        eof = False
+                        break
+                return bodies.keep(url, p, r.status_code, r.headers, eof)
+    except requests.Timeout:
+        return False, "Timeout"
+    # thttp does not retry connects/reads, so urllib3 errors reach here unwrapped
+    # (NewConnectionError subclasses ConnectTimeoutError, hence this order)
+    except (requests.ConnectionError, NewConnectionError, ProtocolError):
+        return False, "No conn"
+    except (ConnectTimeoutError, ReadTimeoutError):
+        return False, "Timeout"
+    except Exception as e:
+        return False, "Error"
+
+# Xtream stream paths, whole path only: /live|movie|series/user/pass/id[.ext], or the bare
+# /user/pass/id.ts|.m3u8 form; a bare id without a stream extension is too common elsewhere
+XT_PATH = re.compile(r'/(?:(?:live|movie|series)/([^/]+)/([^/]+)/\d+(?:\.\w+)?|([^/]+)/([^/]+)/(?:\d+\.(?:ts|m3u8?)|playlist\.m3u8?))')
+
+def canon_key(url):
+    """
+    Account-level identity of a link: (scheme, host without www., port,
+    username, password) for Xtream-style links, whether the credentials sit
+    in the query or the path; otherwise the normalized URL with its query
+    sorted.
+    """
+    try:
+        u = urlparse(url.strip())
+        sc, host = u.scheme.lower(), (u.hostname or '').lower()
+        if host.startswith('www.'): host = host[4:]
+        base = (sc, host, u.port or {'http': 80, 'https': 443}.get(sc))
+    except ValueError:
+        return (url,)
+    q = parse_qs(u.query)
+    if 'username' in q and 'password' in q: return base + (q['username'][0], q['password'][0])
+    m = XT_PATH.fullmatch(u.path)
+    if m: return base + (m.group(1, 2) if m.group(1) is not None else m.group(3, 4))
+    return base + (u.path, tuple(sorted(parse_qsl(u.query))))
+
+def group_links(urls):
+    """{representative: [members]} by canon_key; a get.php member is preferred as the one to test"""
+    g = OrderedDict()
+    for u in urls: g.setdefault(canon_key(u), []).append(u)
+    return {next((u for u in m if '/get.php' in u), m[0]): m for m in g.values()}
+
+def by_history(urls):
+    """urls reordered by their host's past results (DB.hh_rank): recently working first, unknown next, recently failed last"""
+    rk = db.hh_rank()
+    return sorted(urls, key=lambda u: rk.get(_host(u), 1))
+
+def test_links(urls, mode='deep', timeout=12, jobs=None, per_host=None, stop=None):
+    """
+    Test urls on a thread pool, yielding (url, (ok, msg)) as each one
+    finishes. Links of one account (group_links) are tested once and the
+    result is yielded for each of them. At most jobs tests run at once
+    (cfg 'tjobs') and at most per_host against one host (cfg 'thost');
+    hosts take turns, so one slow panel cannot hold every slot, and hosts
+    that worked before go first (by_history). Once stop() is true nothing
+    new starts.
+    """
+    jobs = jobs or int(db.get('tjobs', str(TEST_JOBS)))
+    per_host = per_host or int(db.get('thost', str(TEST_PER_HOST)))
+    fan, q = group_links(urls), OrderedDict()
+    for u in by_history(fan): q.setdefault(_host(u), deque()).append(u)
+    busy, run = {}, {}
+    ex = ThreadPoolExecutor(jobs)
+    try:
+        while True:
+            if stop and stop(): q.clear()
+            more = True
+            while more and q and len(run) < jobs:
+                more = False
+                for h in list(q):
+                    if len(run) >= jobs: break
+                    if busy.get(h, 0) >= per_host: continue
+                    u = q[h].popleft()
+                    if not q[h]: del q[h]
+                    run[ex.submit(test_link, u, mode, timeout)] = u, h
+                    busy[h] = busy.get(h, 0) + 1
+                    more = True
+            if not run: return
+            done, _ = wait(run, return_when=FIRST_COMPLETED)
+            for f in done:
+                u, h = run.pop(f)
+                busy[h] -= 1
+                res = f.result()
+                for m in fan[u]: yield m, res
+    finally:
+        ex.shutdown(wait=False, cancel_futures=True)
+        db.lt_flush()
+
+# ==================== ASYNC LINK TESTING ====================
+# Same probes as test_link on asyncio streams: thousands of them in flight
+# from one thread, no extra dependency. Plain HTTP/1.1 with Connection:
+# close; redirects are followed, chunked bodies decoded.
+ASYNC_JOBS = 256    # default async tests in flight (cfg 'ajobs')
+_ssl = None
+
+def _ssl_ctx():
+    global _ssl
+    if _ssl is None:
+        try:
+            import certifi
+            _ssl = ssl.create_default_context(cafile=certifi.where())
+        except ImportError:
+            _ssl = ssl.create_default_context()
+    return _ssl
+
+async def _body(r, hdr, p):
+    # Feed body chunks to probe p, chunked or not; True if the body ran out first
+    if 'chunked' not in hdr.get('transfer-encoding', ''):
+        while True:
+            d = await r.read(8192)
+            if not d: return True
+            if p.feed(d): return False
+    while True:
+        n = int((await r.readline()).split(b';')[0].strip() or b'0', 16)
+        if not n: return True
+        if p.feed(await r.readexactly(n)): return False
+        await r.readline()
+
+async def ahttp(url, method='GET', p=None, hops=5, cto=None):
+    """(status, headers, eof) of url, redirects followed; a GET body is fed to probe p (ranged, see Probe), each connect capped at cto s"""
+    for _ in range(hops):
+        u = urlparse(url)
+        tls = u.scheme == 'https'
+        t0 = time.perf_counter()
+        r, w = await asyncio.wait_for(asyncio.open_connection(u.hostname, u.port or (443 if tls else 80), ssl=_ssl_ctx() if tls else None), cto)
+        try:
+            path = (u.path or '/') + (f'?{u.query}' if u.query else '')
+            ua = http.headers['User-Agent']
+            rng = f'Range: {PROBE_HDR["Range"]}\r\n' if p else ''
+            w.write(f'{method} {path} HTTP/1.1\r\nHost: {u.netloc}\r\nUser-Agent: {ua}\r\nAccept: */*\r\n{rng}'
+                    f'Accept-Encoding: identity\r\nConnection: close\r\n\r\n'.encode())
+            head = (await r.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+            lat.add(_host(url), time.perf_counter() - t0)
+            code = int(head[0].split()[1])
+            hdr = {k.strip().lower(): v.strip() for k, _, v in (ln.partition(':') for ln in head[1:] if ln)}
+            if code in (301, 302, 303, 307, 308) and 'location' in hdr:
+                url = urljoin(url, hdr['location'])
+                continue
+            if not p or code not in (200, 206): return code, hdr, False
+            p.sized(code, hdr)
+            return code, hdr, await _body(r, hdr, p)
+        finally:
+            w.close()
+    raise OSError('too many redirects')
+
+async def atest_link(url, mode='deep', timeout=12):
+    """Coroutine twin of test_link; same (ok, msg) results, store, breaker, timeouts and hedging"""
+    k = _tkey(url, mode)
+    v = db.lt_get(k)
+    if v: return v
+    h = _host(url)
+    if not breaker.allow(h): return HOST_DOWN
+    t, to, p95 = time.perf_counter(), lat.timeouts(h, timeout), lat.pct(h, .95)
+    to = to[0], min(timeout, to[0] + to[1])
+    a = asyncio.ensure_future(_aprobe(url, mode, to))
+    if p95 and db.get('hedge', 'false') == 'true' and not (await asyncio.wait({a}, timeout=p95))[0]:
+        pend = {a, asyncio.ensure_future(_aprobe(url, mode, to))}
+        while pend:
+            done, pend = await asyncio.wait(pend, return_when=asyncio.FIRST_COMPLETED)
+            ok = [f for f in done if f.result()[0]]
+            a = ok[0] if ok else next(iter(done))
+            if ok: break
+        for f in pend: f.cancel()
+    result = await a
+    if result[1] == 'Timeout': lat.add(h, timeout, False)
+    breaker.record(h, result[1] not in DEAD)
+    db.lt_put(k, result, time.perf_counter() - t, h)
+    return result
+
+async def _aprobe(url, mode, timeout):
+    """timeout is (connect, total) seconds"""
+    cto, timeout = timeout
+    try:
+        api = xtream_api(url) if mode == 'api' else None
+        if api:
+            p = Probe()
+            code, _, _ = await asyncio.wait_for(ahttp(api, 'GET', p, cto=cto), timeout)
+            v = xtream_verdict(p.buf, url) if code in (200, 206) and p.buf else None
+            if v: return v
+        if mode == 'quick':
+            code, _, _ = await asyncio.wait_for(ahttp(url, 'HEAD', cto=cto), timeout)
+            return code == 200, f"HTTP {code}"
+        else:
+            p = Probe()
+            code, hdr, eof = await asyncio.wait_for(ahttp(url, 'GET', p, cto=cto), timeout)
+            if code not in (200, 206): return False, f"HTTP {code}"
+            return bodies.keep(url, p, code, hdr, eof)
+    except asyncio.TimeoutError:
+        return False, "Timeout"
+    except OSError:
+        return False, "No conn"
+    except Exception:
+        return False, "Error"
+
+async def _arun(urls, mode, timeout, jobs, per_host, stop, out):
+    gsem, hsem = asyncio.Semaphore(jobs), {}
+    async def one(u):
+        h = _host(u)
+        if h not in hsem: hsem[h] = asyncio.Semaphore(per_host)
+        async with hsem[h], gsem:
+            if stop and stop(): return
+            res = await atest_link(u, mode, timeout)
+            for m in fan[u]: out.put((m, res))
+    fan = group_links(urls)
+    try: await asyncio.gather(*(one(u) for u in by_history(fan)))
+    finally:
+        db.lt_flush()
+        out.put(None)
+
+def atest_links(urls, mode='deep', timeout=12, jobs=None, per_host=None, stop=None):
+    """
+    Drop-in for test_links on the asyncio engine: one event-loop thread runs
+    up to jobs probes (cfg 'ajobs') with the same per-account fan-out,
+    per-host cap and history order, and results are yielded as they finish.
+    """
+    jobs = jobs or int(db.get('ajobs', str(ASYNC_JOBS)))
+    per_host = per_host or int(db.get('thost', str(TEST_PER_HOST)))
+    out = queue.Queue()
+    threading.Thread(target=asyncio.run, args=(_arun(list(urls), mode, timeout, jobs, per_host, stop, out),), daemon=True).start()
+    for res in iter(out.get, None): yield res
+
+def dedup(chs):
+    """Copy of an already built table without repeated URLs; parsing with dup=True avoids this pass"""
+    uni = ChTable(True)
+    for i in range(len(chs)): uni.add(*chs.fields(i))
+    return uni, uni.ndup
+
+# ==================== MERGE ====================
+TVGID_RE = re.compile(r'tvg-id="([^"]+)"')
+NORM_RE = re.compile(r'[\W_]+')
+
+def _norm(t): return NORM_RE.sub(' ', t.lower()).strip()
+
+class Merger:
+    """
+    One master table built from several sources with cross-source dedup.
+    A channel is keyed by its tvg-id + normalized name when it has a
+    tvg-id (HD/SD/4K variants often share one), else by normalized name +
+    group; per unique channel only the key's hash and its row are
+    indexed, so memory follows the unique count. The source with the lowest
+    latency (ms) keeps the URL of a channel several sources carry. stats
+    holds [source, added, collapsed] per add().
+    """
+    def __init__(s):
+        s.out, s.ix, s.ms, s.stats = ChTable(), {}, array('I'), []
+    
+    def add(s, src, chs, ix=None, cc=None, ms=0):
+        """Merge rows ix (default: all) of chs, exported group names as in m3u_lines; returns (added, collapsed)"""
+        out, seen, group, ms = s.out, s.ix, cc_group(chs, cc), min(int(ms), 0xFFFFFFFF)
+        added = dup = 0
+        for i in (range(len(chs)) if ix is None else ix):
+            name, _, logo, url, ex, opt = chs.fields(i)
+            grp, m = group(i), TVGID_RE.search(ex)
+            k = hash(('t', m.group(1).strip().lower(), _norm(name)) if m else ('g', _norm(name), _norm(grp)))
+            j = seen.get(k)
+            if j is None:
+                seen[k] = out.add(name, grp, logo, url, ex, opt)
+                s.ms.append(ms)
+                added += 1
+                continue
+            dup += 1
+            if ms < s.ms[j]:
+                out.url[j], s.ms[j] = url, ms
+                if opt: out.opt[j] = opt
+                else: out.opt.pop(j, None)
+        s.stats.append([src, added, dup])
+        return added, dup
+
+def src_ms(url):
+    """Latency to rank url as a merge source: its stored test time, else its host's median, else last"""
+    ms = db.lt_ms([_tkey(url, m) for m in ('deep', 'api', 'quick')])
+    if ms is None:
+        p = lat.pct(_host(url), .5)
+        ms = p * 1000 if p else 0xFFFFFFFF
+    return ms
+
+# ==================== STREAM HEALTH ====================
+HEALTH_N = 8          # default channels sampled per playlist (cfg 'hn')
+HEALTH_JOBS = 4       # default sampled streams probed at once (cfg 'hjobs')
+HEALTH_SEC = 3        # seconds of throughput measured per stream
+HEALTH_MAX = 1 << 20  # most bytes read per stream
+HEALTH_BODY = 1 << 20 # most playlist bytes read to draw the sample from
+
+def sample_ch(chs, n):
+    """Up to n row indices spread over the table: groups evenly spaced (all of them if fewer than n), rows evenly spaced within each"""
+    gs = [g['ix'] for g in chs.grps.values() if len(g['ix'])]
+    if len(gs) > n: gs = [gs[(2 * i + 1) * len(gs) // (2 * n)] for i in range(n)]
+    cnt, left = [0] * len(gs), min(n, sum(len(ix) for ix in gs))
+    while left:
+        for j, ix in enumerate(gs):
+            if left and cnt[j] < len(ix): cnt[j], left = cnt[j] + 1, left - 1
+    return [ix[(2 * i + 1) * len(ix) // (2 * c)] for ix, c in zip(gs, cnt) for i in range(c)]
+
+def stream_probe(url, timeout=8, hops=2):
+    """
+    (ttfb s, kB/s) of one channel, None if it does not play. Reads up to
+    HEALTH_MAX bytes or HEALTH_SEC seconds; an HLS playlist is followed to
+    its first variant/segment and the rate is the segment's.
+    """
+    t = time.perf_counter()
+    try:
+        with thttp.get(url, timeout=timeout, stream=True) as r:
+            if r.status_code >= 400: return None
+            it = r.iter_content(16384)   # stream bytes, not playlist traffic
+            ch = next(it, b'')
+            if not ch: return None
+            ttfb = time.perf_counter() - t
+            if ch.lstrip()[:7] == b'#EXTM3U':
+                if not hops: return None
+                for c in it:
+                    ch += c
+                    if len(ch) > PROBE_MAX: break
+                uri = next((ln.strip() for ln in _dec(ch).splitlines() if ln.strip() and not ln.startswith('#')), None)
+                sub = uri and stream_probe(urljoin(r.url, uri), timeout, hops - 1)
+                return sub and (ttfb, sub[1])
+            n = len(ch)
+            for c in it:
+                n += len(c)
+                if n >= HEALTH_MAX or time.perf_counter() - t >= ttfb + HEALTH_SEC: break
+            return ttfb, n / 1024 / (time.perf_counter() - t)
+    except Exception:
+        return None
+
+def health_score(ok, n, ttfb, kbps):
+    """0-100: 60 for the share of sampled streams that play, 20 each for their median TTFB (full <= 0.5 s, none >= 5 s) and rate (full >= 250 kB/s, ~2 Mbit)"""
+    if not ok: return 0
+    return round(60 * ok / n + 20 * min(1, max(0, (5 - ttfb) / 4.5)) + 20 * min(1, kbps / 250))
+
+def _sample_src(url, timeout):
+    # Table to sample from: a body kept by the deep test, else the first HEALTH_BODY bytes (ranged, cut at a line end)
+    b = bodies.get(url)
+    if b is None:
+        buf = bytearray()
+        with thttp.get(url, timeout=timeout, stream=True, headers={'Range': f'bytes=0-{HEALTH_BODY - 1}', 'Accept-Encoding': 'identity'}) as r:
+            if r.status_code not in (200, 206): return None
+            for ch in metered(r):
+                buf += ch
+                if len(buf) >= HEALTH_BODY: break
+        if len(buf) >= HEALTH_BODY: del buf[buf.rfind(b'\n', 0, HEALTH_BODY) + 1:]
+        b = bytes(buf)
+    return parse_m3u(b, url, dup=True)[0]
+
+def playlist_health(url, n=None, jobs=None, timeout=8):
+    """
+    Stream-level check of a playlist that already passed its link test:
+    n channels (cfg 'hn') sampled across its groups are probed jobs at a
+    time (cfg 'hjobs'). Returns and stores (DB.hs_put) {'score', 'ok', 'n',
+    'ttfb', 'kbps'} with medians over the playing streams; None if the
+    playlist itself cannot be loaded. The sample comes from the body the
+    deep test kept (bodies) or from at most HEALTH_BODY bytes of the
+    playlist, never a full download.
+    """
+    n = n or int(db.get('hn', str(HEALTH_N)))
+    jobs = jobs or int(db.get('hjobs', str(HEALTH_JOBS)))
+    try: chs = _sample_src(url, timeout)
+    except Exception: return None
+    if chs is None: return None
+    urls = [chs.url[i] for i in sample_ch(chs, n)]
+    del chs
+    with ThreadPoolExecutor(jobs) as ex: res = [r for r in ex.map(lambda u: stream_probe(u, timeout), urls) if r]
+    tt, kb = sorted(r[0] for r in res), sorted(r[1] for r in res)
+    h = {'ok': len(res), 'n': len(urls), 'ttfb': tt[len(tt) // 2] if res else 0, 'kbps': kb[len(kb) // 2] if res else 0}
+    h['score'] = health_score(h['ok'], h['n'] or 1, h['ttfb'], h['kbps'])
+    db.hs_put(url, h)
+    return h
+
+# ==================== DATABASE ====================
+class DB:
+    def __init__(s):
+        s.path = os.path.join(app_path(), 'iptv.db')
+        s.cn, s.lk = None, threading.RLock()
+        s.lth, s.ltm, s.ltw = 0, 0, 0
+        s._init()
+    
+    def _cn(s):
+        if not s.cn:
+            s.cn = sqlite3.connect(s.path, check_same_thread=False)
+            s.cn.row_factory = sqlite3.Row
+        return s.cn
+    
+    def _init(s):
+        c = s._cn().cursor()
+        c.execute('CREATE TABLE IF NOT EXISTS cfg (k TEXT PRIMARY KEY, v TEXT)')
+        c.execute('CREATE TABLE IF NOT EXISTS fav (id INTEGER PRIMARY KEY, url TEXT UNIQUE, name TEXT, exp TEXT, cnt INTEGER DEFAULT 0)')
+        c.execute('CREATE TABLE IF NOT EXISTS st (id INTEGER PRIMARY KEY, dt TEXT UNIQUE, te INTEGER DEFAULT 0, wo INTEGER DEFAULT 0, ch INTEGER DEFAULT 0, fi INTEGER DEFAULT 0)')
+        c.execute('CREATE TABLE IF NOT EXISTS pc (k TEXT PRIMARY KEY, url TEXT, etag TEXT, lm TEXT, sz INTEGER DEFAULT 0, ts REAL, at REAL)')
+        c.execute('CREATE TABLE IF NOT EXISTS lt (k TEXT PRIMARY KEY, ok INTEGER, msg TEXT, ms INTEGER, ch INTEGER DEFAULT 0, ts REAL)')
+        c.execute('CREATE TABLE IF NOT EXISTS hh (h TEXT PRIMARY KEY, okts REAL, fts REAL)')
+        c.execute('CREATE TABLE IF NOT EXISTS hs (url TEXT PRIMARY KEY, score INTEGER, ok INTEGER, n INTEGER, ttfb REAL, kbps REAL, ts REAL)')
+        s._cn().commit()
+        for k, v in {'theme': 'cyberpunk', 'mode': 'deep', 'fmt': 'm3u8', 'dup': 'true', 'to': '12', 'pcage': '24', 'pcmb': '100', 'pjobs': '0', 'gz': 'false', 'tjobs': str(TEST_JOBS), 'thost': str(TEST_PER_HOST), 'ajobs': str(ASYNC_JOBS), 'engine': 'thread', 'ltok': '24', 'ltfail': '3', 'hedge': 'false', 'chcty': 'false', 'fjobs': str(PIPE_JOBS), 'health': 'false', 'hn': str(HEALTH_N), 'hjobs': str(HEALTH_JOBS)}.items():
+            c.execute('INSERT OR IGNORE INTO cfg VALUES (?,?)', (k, v))
+        s._cn().commit()
+    
+    def get(s, k, d=None):
+        c = s._cn().cursor()
+        c.execute('SELECT v FROM cfg WHERE k=?', (k,))
+        r = c.fetchone()
+        return r['v'] if r else d
+    
+    def set(s, k, v):
+        s._cn().cursor().execute('INSERT OR REPLACE INTO cfg VALUES (?,?)', (k, str(v)))
+        s._cn().commit()
+    
+    def add_fav(s, u, n='', e='', c=0):
+        try:
+            s._cn().cursor().execute('INSERT OR REPLACE INTO fav (url,name,exp,cnt) VALUES (?,?,?,?)', (u, n or short_dom(u), e, c))
+            s._cn().commit()
+            return True
+        except: return False
+    
+    def del_fav(s, u):
+        s._cn().cursor().execute('DELETE FROM fav WHERE url=?', (u,))
+        s._cn().commit()
+    
+    def favs(s):
+        c = s._cn().cursor()
+        c.execute('SELECT * FROM fav ORDER BY id DESC')
+        return [dict(r) for r in c.fetchall()]
+    
+    def stat(s, te=0, wo=0, ch=0, fi=0):
+        dt = datetime.now().strftime('%Y-%m-%d')
+        c = s._cn().cursor()
+        c.execute('SELECT * FROM st WHERE dt=?', (dt,))
+        if c.fetchone(): c.execute('UPDATE st SET te=te+?,wo=wo+?,ch=ch+?,fi=fi+? WHERE dt=?', (te, wo, ch, fi, dt))
+        else: c.execute('INSERT INTO st (dt,te,wo,ch,fi) VALUES (?,?,?,?,?)', (dt, te, wo, ch, fi))
+        s._cn().commit()
+    
+    def stats(s):
+        c = s._cn().cursor()
+        c.execute('SELECT SUM(te) as t, SUM(wo) as w, SUM(ch) as c, SUM(fi) as f FROM st')
+        r = c.fetchone()
+        return {'te': r['t'] or 0, 'wo': r['w'] or 0, 'ch': r['c'] or 0, 'fi': r['f'] or 0}
+    
+    def pc_get(s, k):
+        c = s._cn().cursor()
+        c.execute('SELECT * FROM pc WHERE k=?', (k,))
+        r = c.fetchone()
+        return dict(r) if r else None
+    
+    def pc_put(s, k, url, etag, lm, sz):
+        now = time.time()
+        s._cn().cursor().execute('INSERT OR REPLACE INTO pc VALUES (?,?,?,?,?,?,?)', (k, url, etag, lm, sz, now, now))
+        s._cn().commit()
+    
+    def pc_touch(s, k, fresh=True):
+        """Mark entry k used; fresh (a 304) also restarts its age"""
+        now = time.time()
+        if fresh: s._cn().cursor().execute('UPDATE pc SET ts=?, at=? WHERE k=?', (now, now, k))
+        else: s._cn().cursor().execute('UPDATE pc SET at=? WHERE k=?', (now, k))
+        s._cn().commit()
+    
+    def pc_list(s):
+        c = s._cn().cursor()
+        c.execute('SELECT k, sz, ts FROM pc ORDER BY at DESC')
+        return [dict(r) for r in c.fetchall()]
+    
+    def pc_del(s, ks=None):
+        c = s._cn().cursor()
+        if ks is None: c.execute('DELETE FROM pc')
+        else: c.executemany('DELETE FROM pc WHERE k=?', [(k,) for k in ks])
+        s._cn().commit()
+    
+    def _ttl(s):
+        return float(s.get('ltok', '24')) * 3600, float(s.get('ltfail', '3')) * 3600
+    
+    def lt_get(s, k):
+        """Stored (ok, msg) of test key k while fresh: cfg 'ltok' hours for working links, 'ltfail' for failures"""
+        tok, tfail = s._ttl()
+        with s.lk:
+            c = s._cn().cursor()
+            c.execute('SELECT ok, msg FROM lt WHERE k=? AND ts > ? - CASE ok WHEN 1 THEN ? ELSE ? END', (k, time.time(), tok, tfail))
+            r = c.fetchone()
+            if r: s.lth += 1
+            else: s.ltm += 1
+        return (bool(r['ok']), r['msg']) if r else None
+    
+    def lt_put(s, k, res, sec, h=None):
+        """Store a test result, and when and how host h last answered (committed in batches, see lt_flush)"""
+        ok, msg = res
+        m = re.search(r'(\d+)\+? ch$', msg) if ok else None
+        now = time.time()
+        with s.lk:
+            c = s._cn().cursor()
+            c.execute('INSERT OR REPLACE INTO lt VALUES (?,?,?,?,?,?)', (k, int(ok), msg, int(sec * 1000), int(m.group(1)) if m else 0, now))
+            if h: c.execute('INSERT INTO hh VALUES (?,?,?) ON CONFLICT(h) DO UPDATE SET okts=COALESCE(excluded.okts, okts), fts=COALESCE(excluded.fts, fts)', (h, now if ok else None, None if ok else now))
+            s.ltw += 1
+            if s.ltw >= 50: s.lt_flush()
+    
+    def lt_flush(s):
+        """Commit pending results and drop rows past both TTLs"""
+        with s.lk:
+            old = time.time() - max(s._ttl())
+            s._cn().cursor().execute('DELETE FROM lt WHERE ts < ?', (old,))
+            s._cn().cursor().execute('DELETE FROM hh WHERE MAX(COALESCE(okts, 0), COALESCE(fts, 0)) < ?', (old,))
+            s._cn().commit()
+            s.ltw = 0
+    
+    def hh_rank(s):
+        """{host: 0 if it had a working link within cfg 'ltok', else 2 if one failed within 'ltfail'}; unknown hosts rank 1"""
+        tok, tfail = s._ttl()
+        now = time.time()
+        with s.lk:
+            c = s._cn().cursor()
+            c.execute('SELECT h, okts, fts FROM hh')
+            return {r['h']: 0 if (r['okts'] or 0) > now - tok else 2 if (r['fts'] or 0) > now - tfail else 1 for r in c.fetchall()}
+    
+    def lt_ms(s, ks):
+        """Fastest stored test time (ms) among keys ks, None if none is stored"""
+        c = s._cn().cursor()
+        c.execute(f'SELECT MIN(ms) FROM lt WHERE k IN ({",".join("?" * len(ks))})', ks)
+        return c.fetchone()[0]
+    
+    def lt_count(s):
+        c = s._cn().cursor()
+        c.execute('SELECT COUNT(*) FROM lt')
+        return c.fetchone()[0]
+    
+    def lt_del(s):
+        with s.lk:
+            s._cn().cursor().execute('DELETE FROM lt')
+            s._cn().cursor().execute('DELETE FROM hh')
+            s._cn().commit()
+            s.lth = s.ltm = s.ltw = 0
+    
+    def hs_put(s, u, h):
+        with s.lk:
+            s._cn().cursor().execute('INSERT OR REPLACE INTO hs VALUES (?,?,?,?,?,?,?)', (u, h['score'], h['ok'], h['n'], h['ttfb'], h['kbps'], time.time()))
+            s._cn().commit()
+    
+    def hs_get(s, u):
+        """Last stream-health result of playlist u, see playlist_health"""
+        c = s._cn().cursor()
+        c.execute('SELECT score, ok, n, ttfb, kbps, ts FROM hs WHERE url=?', (u,))
+        r = c.fetchone()
+        return dict(r) if r else None
+    
+    def close(s):
+        if s.cn: s.cn.close()
+
+db = DB()
+
+# ==================== PLAYLIST CACHE ====================
+class PlCache:
+    """
+    On-disk cache of playlist bodies keyed by URL, gzip-compressed. Entries
+    keep the server's ETag/Last-Modified, refetches are conditional and a
+    304 is served from disk. Bounded by cfg 'pcmb' (MB on disk, LRU) and
+    'pcage' (hours), which is also the freshness lifetime of bodies sent
+    without a validator: those are served from disk with no request until
+    they are that old.
+    """
+    def __init__(s, path):
+        s.path = path
+    
+    def _fp(s, k): return os.path.join(s.path, k + '.m3u.gz')
+    
+    def _age(s): return float(db.get('pcage', '24')) * 3600
+    
+    @contextmanager
+    def lines(s, url, timeout=30):
+        """Lines of the playlist at url, from the network, or from disk on 304 or while fresh without a validator"""
+        k = hashlib.md5(url.encode()).hexdigest()
+        age, e, fp, hdr = s._age(), db.pc_get(k), s._fp(k), {}
+        if e and time.time() - e['ts'] < age and os.path.exists(fp):
+            if e['etag']: hdr['If-None-Match'] = e['etag']
+            if e['lm']: hdr['If-Modified-Since'] = e['lm']
+            if not hdr:
+                db.pc_touch(k, False)
+                with gzip.open(fp, 'rb') as f:
+                    yield chunk_lines(iter(lambda: f.read(65536), b''))
+                return
+        with http.get(url, timeout=timeout, stream=True, headers=hdr) as r:
+            if r.status_code == 304 and hdr:
+                db.pc_touch(k)
+                with gzip.open(fp, 'rb') as f:
+                    yield chunk_lines(iter(lambda: f.read(65536), b''))
+                return
+            etag, lm = r.headers.get('ETag'), r.headers.get('Last-Modified')
+            if r.status_code != 200 or age <= 0:
+                yield resp_lines(r)
+                return
+            os.makedirs(s.path, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(suffix='.part', dir=s.path)
+            done = []
+            try:
+                with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=GZ_LEVEL, mtime=0) as f:
+                    yield chunk_lines(s._tee(metered(r), f, done))
+                if done: os.replace(tmp, fp)
+            finally:
+                if os.path.exists(tmp): os.remove(tmp)
+            if not done: return
+        db.pc_put(k, url, etag, lm, os.path.getsize(fp))
+        s.evict()
+    
+    @staticmethod
+    def _tee(chunks, f, done):
+        # Pass chunks through while writing them to f; flag a complete body
+        for ch in chunks:
+            f.write(ch)
+            yield ch
+        done.append(1)
+    
+    def evict(s):
+        cap, age, now = float(db.get('pcmb', '100')) * 1e6, s._age(), time.time()
+        tot, drop = 0, []
+        for e in db.pc_list():
+            if now - e['ts'] > age or tot + e['sz'] > cap: drop.append(e['k'])
+            else: tot += e['sz']
+        for k in drop:
+            try: os.remove(s._fp(k))
+            except OSError: pass
+        if drop: db.pc_del(drop)
+    
+    def size(s): return sum(e['sz'] for e in db.pc_list())
+    
+    def clear(s):
+        db.pc_del()
+        if os.path.isdir(s.path):
+            for fn in os.listdir(s.path):
+                try: os.remove(os.path.join(s.path, fn))
+                except OSError: pass
+
+plcache = PlCache(os.path.join(app_path(), 'plcache'))
+
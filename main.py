@@ -7,11 +7,8 @@ IPTV Editor Pro v11.0 ULTIMATE
 - Custom app icon support
 """
 
-import os, sys, re, gc, sqlite3, hashlib, traceback, threading, time
+import os, sys, traceback, threading, time
 from datetime import datetime
-from urllib.parse import urlparse, parse_qs, urlencode
-from functools import lru_cache
-from collections import OrderedDict
 
 def log_err(msg):
     try:
@@ -45,6 +42,7 @@ from kivy.uix.image import Image, AsyncImage
 from kivy.uix.widget import Widget
 from kivy.uix.slider import Slider
 from kivy.uix.switch import Switch
+from kivy.uix.filechooser import FileChooserListView
 from kivy.clock import Clock
 from kivy.metrics import dp, sp
 from kivy.core.window import Window
@@ -55,9 +53,10 @@ from kivy.utils import get_color_from_hex
 from kivy.animation import Animation
 from kivy.graphics import Color, Rectangle, RoundedRectangle, Line, Ellipse
 
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from core import (
+    COUNTRIES, PRIO_C, SmartLinkExtractor, iptv_folder, get_icon,
+    short_dom, gc_, detect_c, fetch_m3u, load_m3u, fetch_many, write_m3u, chan_cty, pick_cty, Merger, src_ms, out_ext, test_links, atest_links, group_links, breaker, BRK_COOL, playlist_health, db, plcache, bodies, traffic,
+)
 
 APP_NAME = "IPTV Editor Pro"
 APP_VER = "11.0"
@@ -231,425 +230,6 @@ theme = 'cyberpunk'
 def T(k): return THEMES.get(theme, THEMES['cyberpunk']).get(k, '#ffffff')
 def TC(k): return get_color_from_hex(T(k))
 
-# ==================== COUNTRIES ====================
-COUNTRIES = {
-    'turkey': {'n': 'Turkiye', 'f': '🇹🇷', 'c': ['tr', 'tur', 'turkey', 'turkiye', 'turk'], 'p': 1},
-    'germany': {'n': 'Almanya', 'f': '🇩🇪', 'c': ['de', 'ger', 'germany', 'deutsch', 'almanya'], 'p': 2},
-    'austria': {'n': 'Avusturya', 'f': '🇦🇹', 'c': ['at', 'aut', 'austria', 'avusturya', 'osterreich'], 'p': 3},
-    'romania': {'n': 'Romanya', 'f': '🇷🇴', 'c': ['ro', 'rom', 'romania', 'romanya'], 'p': 4},
-    'france': {'n': 'Fransa', 'f': '🇫🇷', 'c': ['fr', 'fra', 'france', 'fransa'], 'p': 5},
-    'italy': {'n': 'Italya', 'f': '🇮🇹', 'c': ['it', 'ita', 'italy', 'italya'], 'p': 6},
-    'spain': {'n': 'Ispanya', 'f': '🇪🇸', 'c': ['es', 'esp', 'spain', 'ispanya'], 'p': 7},
-    'uk': {'n': 'Ingiltere', 'f': '🇬🇧', 'c': ['uk', 'gb', 'england', 'british'], 'p': 8},
-    'usa': {'n': 'Amerika', 'f': '🇺🇸', 'c': ['us', 'usa', 'america', 'amerika'], 'p': 9},
-    'netherlands': {'n': 'Hollanda', 'f': '🇳🇱', 'c': ['nl', 'netherlands', 'holland'], 'p': 10},
-    'poland': {'n': 'Polonya', 'f': '🇵🇱', 'c': ['pl', 'poland', 'polonya'], 'p': 11},
-    'russia': {'n': 'Rusya', 'f': '🇷🇺', 'c': ['ru', 'rus', 'russia', 'rusya'], 'p': 12},
-    'arabic': {'n': 'Arapca', 'f': '🇸🇦', 'c': ['ar', 'ara', 'arabic', 'arab'], 'p': 13},
-    'other': {'n': 'Diger', 'f': '🌐', 'c': ['other'], 'p': 99},
-}
-PRIO_C = ['turkey', 'germany', 'austria', 'romania']
-FMTS = {'m3u': '.m3u', 'm3u8': '.m3u8', 'txt': '.txt'}
-
-# ==================== SMART LINK EXTRACTOR ====================
-class SmartLinkExtractor:
-    """
-    AI-like pattern matching to extract IPTV links from messy text
-    Handles Telegram-style formatted text with emojis and special characters
-    """
-    
-    # IPTV URL patterns
-    URL_PATTERNS = [
-        # Standard m3u links
-        r'(https?://[^\s<>"\']+?/get\.php\?[^\s<>"\']+)',
-        # Live/Movie/Series streams
-        r'(https?://[^\s<>"\']+?/live/[^\s<>"\']+)',
-        r'(https?://[^\s<>"\']+?/movie/[^\s<>"\']+)',
-        r'(https?://[^\s<>"\']+?/series/[^\s<>"\']+)',
-        # Panel links
-        r'(https?://[^\s<>"\']+?/panel_api\.php\?[^\s<>"\']+)',
-        # Player API
-        r'(https?://[^\s<>"\']+?/player_api\.php\?[^\s<>"\']+)',
-        # Direct m3u8/ts
-        r'(https?://[^\s<>"\']+?\.m3u8?(?:\?[^\s<>"\']*)?)',
-        r'(https?://[^\s<>"\']+?\.ts(?:\?[^\s<>"\']*)?)',
-        # Generic IPTV ports (common: 8080, 8000, 80, 25461, 2095, 2082)
-        r'(https?://[^\s<>"\']+?:(?:8080|8000|25461|2095|2082|80)/[^\s<>"\']+)',
-    ]
-    
-    # Patterns to extract username/password from text
-    CREDENTIAL_PATTERNS = [
-        r'[Uu]ser(?:name)?[:\s=]+([A-Za-z0-9_.-]+)',
-        r'👥\s*[^\s]+\s+([A-Za-z0-9_.-]+)',  # 👥 𝕌𝕤𝕖𝕣 username
-        r'[Pp]ass(?:word)?[:\s=]+([A-Za-z0-9_.-]+)',
-        r'🔑\s*[^\s]+\s+([A-Za-z0-9_.-]+)',  # 🔑 ℙ𝕒𝕤𝕤 password
-    ]
-    
-    # Portal/Host patterns
-    PORTAL_PATTERNS = [
-        r'[Pp]ortal[:\s]+\s*(https?://[^\s]+)',
-        r'👀\s*[^\s]+\s+(https?://[^\s]+)',  # 👀 ℙ𝕠𝕣𝕥𝕒𝕝 http://...
-        r'[Hh]ost[:\s]+\s*(https?://[^\s]+)',
-        r'[Ss]erver[:\s]+\s*(https?://[^\s]+)',
-        r'🔰\s*[^\s]+\s+(https?://[^\s]+)',  # 🔰 ℝ𝕖𝕒𝕝 𝕌𝕣𝕝
-    ]
-    
-    @classmethod
-    def extract_links(cls, text):
-        """Extract all IPTV links from text"""
-        links = set()
-        
-        # Method 1: Direct URL extraction
-        for pattern in cls.URL_PATTERNS:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            for m in matches:
-                url = cls._clean_url(m)
-                if cls._is_valid_iptv_url(url):
-                    links.add(url)
-        
-        # Method 2: Build URLs from portal + credentials
-        portals = []
-        usernames = []
-        passwords = []
-        
-        for pattern in cls.PORTAL_PATTERNS:
-            portals.extend(re.findall(pattern, text, re.IGNORECASE))
-        
-        # Extract usernames
-        user_matches = re.findall(r'[Uu]ser(?:name)?[:\s=]+\s*([A-Za-z0-9_.-]+)', text)
-        usernames.extend(user_matches)
-        user_matches2 = re.findall(r'👥[^A-Za-z0-9]*([A-Za-z0-9_.-]+)', text)
-        usernames.extend(user_matches2)
-        
-        # Extract passwords
-        pass_matches = re.findall(r'[Pp]ass(?:word)?[:\s=]+\s*([A-Za-z0-9_.-]+)', text)
-        passwords.extend(pass_matches)
-        pass_matches2 = re.findall(r'🔑[^A-Za-z0-9]*([A-Za-z0-9_.-]+)', text)
-        passwords.extend(pass_matches2)
-        
-        # Build URLs from combinations
-        for portal in portals:
-            portal = cls._clean_url(portal)
-            if portal:
-                for i, user in enumerate(usernames):
-                    pwd = passwords[i] if i < len(passwords) else ''
-                    if user and pwd:
-                        # Build get.php URL
-                        base = portal.rstrip('/')
-                        if ':' in base.split('/')[-1]:  # Has port
-                            url = f"{base}/get.php?username={user}&password={pwd}&type=m3u_plus"
-                        else:
-                            url = f"{base}:8080/get.php?username={user}&password={pwd}&type=m3u_plus"
-                        links.add(url)
-        
-        # Method 3: Look for M3U emoji patterns (🎬 𝕄𝟛𝕦)
-        m3u_pattern = r'🎬[^h]*(https?://[^\s<>"\']+)'
-        m3u_matches = re.findall(m3u_pattern, text)
-        for m in m3u_matches:
-            url = cls._clean_url(m)
-            if cls._is_valid_iptv_url(url):
-                links.add(url)
-        
-        return list(links)
-    
-    @classmethod
-    def _clean_url(cls, url):
-        """Clean and normalize URL"""
-        if not url:
-            return ''
-        # Remove trailing punctuation
-        url = url.rstrip('.,;:!?)]\'"')
-        # Remove unicode fancy characters around URL
-        url = re.sub(r'[^\x00-\x7F]+$', '', url)
-        return url.strip()
-    
-    @classmethod
-    def _is_valid_iptv_url(cls, url):
-        """Check if URL looks like valid IPTV link"""
-        if not url or not url.startswith('http'):
-            return False
-        # Must have either get.php, live/, or common IPTV patterns
-        iptv_indicators = [
-            'get.php', 'player_api.php', 'panel_api.php',
-            '/live/', '/movie/', '/series/',
-            '.m3u', '.m3u8', '.ts',
-            'username=', 'password=',
-        ]
-        return any(ind in url.lower() for ind in iptv_indicators) or \
-               re.search(r':\d{4,5}/', url)  # Has port number
-    
-    @classmethod
-    def extract_expire_from_text(cls, text):
-        """Extract expiry date from text"""
-        patterns = [
-            r'[Ee]xp(?:ire)?[:\s]+(\d{4}-\d{2}-\d{2})',
-            r'📆\s*[^\d]*(\d{4}-\d{2}-\d{2})',
-            r'[Ee]xp(?:ire)?[:\s]+(\d{2}[./]\d{2}[./]\d{4})',
-        ]
-        for p in patterns:
-            m = re.search(p, text)
-            if m:
-                return m.group(1)
-        return None
-
-# ==================== CACHE & HTTP ====================
-class Cache:
-    def __init__(s, cap=500):
-        s.d, s.cap = OrderedDict(), cap
-    def get(s, k):
-        if k in s.d: s.d.move_to_end(k); return s.d[k]
-        return None
-    def put(s, k, v):
-        if k in s.d: s.d.move_to_end(k)
-        s.d[k] = v
-        if len(s.d) > s.cap: s.d.popitem(last=False)
-    def clear(s): s.d.clear()
-
-cache = Cache(500)
-
-def mk_http():
-    s = requests.Session()
-    r = Retry(total=2, backoff_factor=0.3, status_forcelist=[500,502,503,504])
-    a = HTTPAdapter(max_retries=r, pool_connections=20, pool_maxsize=30)
-    s.mount('http://', a)
-    s.mount('https://', a)
-    s.headers.update({'User-Agent': 'VLC/3.0.20 LibVLC/3.0.20', 'Accept': '*/*', 'Connection': 'keep-alive'})
-    return s
-
-http = mk_http()
-
-# ==================== PATH HELPERS ====================
-def base_path():
-    try:
-        from android.storage import primary_external_storage_path
-        return os.path.join(primary_external_storage_path(), 'Download')
-    except: return os.path.expanduser('~')
-
-def iptv_folder():
-    p = os.path.join(base_path(), 'IPTV')
-    try: os.makedirs(p, exist_ok=True)
-    except: return base_path()
-    return p
-
-def app_path():
-    try:
-        from android.storage import app_storage_path
-        return app_storage_path()
-    except:
-        p = os.path.join(os.path.expanduser('~'), '.iptv')
-        os.makedirs(p, exist_ok=True)
-        return p
-
-def get_icon():
-    """Get custom app icon from Download folder"""
-    paths = [
-        os.path.join(base_path(), 'icon.png'),
-        os.path.join(base_path(), 'iptv_icon.png'),
-        'icon.png',
-    ]
-    for p in paths:
-        if os.path.exists(p):
-            return p
-    return None
-
-def short_dom(url):
-    try:
-        d = urlparse(url).netloc
-        if d.startswith('www.'): d = d[4:]
-        p = d.split('.')
-        return '.'.join(p[-2:])[:18] if len(p) > 2 else d[:18]
-    except: return 'iptv'
-
-def gc_(): gc.collect()
-
-# ==================== EXPIRE DETECTION ====================
-def get_expire(content, url):
-    now = datetime.now()
-    try:
-        q = parse_qs(urlparse(url).query)
-        for k in ['exp', 'expires', 'expire', 'e']:
-            if k in q:
-                ts = int(q[k][0])
-                if ts > 1e12: ts //= 1000
-                if 1704067200 < ts < 1893456000:
-                    dt = datetime.fromtimestamp(ts)
-                    if dt > now: return dt.strftime('%d.%m.%Y')
-                    return f'{dt.strftime("%d.%m.%Y")} [EXPIRED]'
-    except: pass
-    for p in [r'[?&]exp[ire]*[s]?=(\d{10,13})', r'"exp[ire]*":\s*(\d{10,13})']:
-        for m in re.findall(p, (content or '')[:5000], re.I):
-            try:
-                ts = int(m)
-                if ts > 1e12: ts //= 1000
-                if 1704067200 < ts < 1893456000:
-                    dt = datetime.fromtimestamp(ts)
-                    if dt > now: return dt.strftime('%d.%m.%Y')
-                    return f'{dt.strftime("%d.%m.%Y")} [EXPIRED]'
-            except: pass
-    return ''
-
-# ==================== COUNTRY DETECTION ====================
-@lru_cache(3000)
-def detect_c(grp):
-    if not grp: return 'other'
-    g = grp.lower()
-    for cid, cd in COUNTRIES.items():
-        for code in cd['c']:
-            if g == code or g.startswith(code+' ') or g.startswith(code+'-') or g.endswith(' '+code):
-                return cid
-            if re.search(rf'\b{re.escape(code)}\b', g): return cid
-    return 'other'
-
-# ==================== M3U PARSER ====================
-GRP_RE = re.compile(r'group-title="([^"]*)"')
-LOGO_RE = re.compile(r'tvg-logo="([^"]*)"')
-NAME_RE = re.compile(r',([^,]+)$')
-
-def parse_m3u(content, url=''):
-    chs, grps = [], {}
-    exp = get_expire(content, url)
-    cur = None
-    for ln in content.split('\n'):
-        ln = ln.strip()
-        if ln.startswith('#EXTINF:'):
-            cur = {'name': '', 'group': 'Diger', 'logo': '', 'url': ''}
-            m = GRP_RE.search(ln)
-            if m and m.group(1): cur['group'] = m.group(1).strip()
-            m = LOGO_RE.search(ln)
-            if m: cur['logo'] = m.group(1)
-            m = NAME_RE.search(ln)
-            if m: cur['name'] = m.group(1).strip()
-        elif cur and ln.startswith(('http://', 'https://', 'rtmp://')):
-            cur['url'] = ln
-            chs.append(cur)
-            g = cur['group']
-            if g not in grps:
-                grps[g] = {'chs': [], 'logo': cur.get('logo', ''), 'cty': detect_c(g)}
-            grps[g]['chs'].append(cur)
-            cur = None
-    return chs, grps, exp
-
-def gen_m3u(chs):
-    lines = ['#EXTM3U']
-    for c in chs:
-        ext = '#EXTINF:-1'
-        if c.get('logo'): ext += f' tvg-logo="{c["logo"]}"'
-        if c.get('group'): ext += f' group-title="{c["group"]}"'
-        ext += f',{c.get("name", "CH")}'
-        lines.append(ext)
-        lines.append(c.get('url', ''))
-    return '\n'.join(lines)
-
-# ==================== LINK TESTING ====================
-def test_link(url, mode='deep', timeout=12):
-    k = hashlib.md5(url.encode()).hexdigest()[:12]
-    v = cache.get(k)
-    if v: return v
-    
-    try:
-        if mode == 'quick':
-            r = http.head(url, timeout=timeout, allow_redirects=True)
-            result = (r.status_code == 200, f"HTTP {r.status_code}")
-        else:
-            r = http.get(url, timeout=timeout, stream=True)
-            if r.status_code != 200:
-                return False, f"HTTP {r.status_code}"
-            c, t = '', 0
-            for ch in r.iter_content(8192, decode_unicode=True):
-                if isinstance(ch, bytes): c += ch.decode('utf-8', errors='ignore')
-                else: c += ch
-                t += len(ch) if isinstance(ch, str) else len(ch)
-                if t > 50000: break
-            r.close()
-            if len(c) < 50:
-                result = (False, "Empty")
-            elif '#EXTINF' in c:
-                chs, _, _ = parse_m3u(c, url)
-                result = (True, f"{len(chs)} ch") if chs else (False, "No ch")
-            else:
-                result = (True, "Stream") if t > 3000 else (False, "Invalid")
-        cache.put(k, result)
-        return result
-    except requests.Timeout:
-        return False, "Timeout"
-    except Exception as e:
-        return False, "Error"
-
-def dedup(chs):
-    seen, uni = {}, []
-    for c in chs:
-        u = c.get('url', '')
-        if u and u not in seen: seen[u] = 1; uni.append(c)
-    return uni, len(chs) - len(uni)
-
-# ==================== DATABASE ====================
-class DB:
-    def __init__(s):
-        s.path = os.path.join(app_path(), 'iptv.db')
-        s.cn = None
-        s._init()
-    
-    def _cn(s):
-        if not s.cn:
-            s.cn = sqlite3.connect(s.path, check_same_thread=False)
-            s.cn.row_factory = sqlite3.Row
-        return s.cn
-    
-    def _init(s):
-        c = s._cn().cursor()
-        c.execute('CREATE TABLE IF NOT EXISTS cfg (k TEXT PRIMARY KEY, v TEXT)')
-        c.execute('CREATE TABLE IF NOT EXISTS fav (id INTEGER PRIMARY KEY, url TEXT UNIQUE, name TEXT, exp TEXT, cnt INTEGER DEFAULT 0)')
-        c.execute('CREATE TABLE IF NOT EXISTS st (id INTEGER PRIMARY KEY, dt TEXT UNIQUE, te INTEGER DEFAULT 0, wo INTEGER DEFAULT 0, ch INTEGER DEFAULT 0, fi INTEGER DEFAULT 0)')
-        s._cn().commit()
-        for k, v in {'theme': 'cyberpunk', 'mode': 'deep', 'fmt': 'm3u8', 'dup': 'true', 'to': '12'}.items():
-            c.execute('INSERT OR IGNORE INTO cfg VALUES (?,?)', (k, v))
-        s._cn().commit()
-    
-    def get(s, k, d=None):
-        c = s._cn().cursor()
-        c.execute('SELECT v FROM cfg WHERE k=?', (k,))
-        r = c.fetchone()
-        return r['v'] if r else d
-    
-    def set(s, k, v):
-        s._cn().cursor().execute('INSERT OR REPLACE INTO cfg VALUES (?,?)', (k, str(v)))
-        s._cn().commit()
-    
-    def add_fav(s, u, n='', e='', c=0):
-        try:
-            s._cn().cursor().execute('INSERT OR REPLACE INTO fav (url,name,exp,cnt) VALUES (?,?,?,?)', (u, n or short_dom(u), e, c))
-            s._cn().commit()
-            return True
-        except: return False
-    
-    def del_fav(s, u):
-        s._cn().cursor().execute('DELETE FROM fav WHERE url=?', (u,))
-        s._cn().commit()
-    
-    def favs(s):
-        c = s._cn().cursor()
-        c.execute('SELECT * FROM fav ORDER BY id DESC')
-        return [dict(r) for r in c.fetchall()]
-    
-    def stat(s, te=0, wo=0, ch=0, fi=0):
-        dt = datetime.now().strftime('%Y-%m-%d')
-        c = s._cn().cursor()
-        c.execute('SELECT * FROM st WHERE dt=?', (dt,))
-        if c.fetchone(): c.execute('UPDATE st SET te=te+?,wo=wo+?,ch=ch+?,fi=fi+? WHERE dt=?', (te, wo, ch, fi, dt))
-        else: c.execute('INSERT INTO st (dt,te,wo,ch,fi) VALUES (?,?,?,?,?)', (dt, te, wo, ch, fi))
-        s._cn().commit()
-    
-    def stats(s):
-        c = s._cn().cursor()
-        c.execute('SELECT SUM(te) as t, SUM(wo) as w, SUM(ch) as c, SUM(fi) as f FROM st')
-        r = c.fetchone()
-        return {'te': r['t'] or 0, 'wo': r['w'] or 0, 'ch': r['c'] or 0, 'fi': r['f'] or 0}
-    
-    def close(s):
-        if s.cn: s.cn.close()
-
-db = DB()
-
 # ==================== KIVY LANG ====================
 KV = '''
 #:import dp kivy.metrics.dp
@@ -1062,6 +642,10 @@ class AutoInputScreen(BaseScreen):
         s.db = ToggleButton(text=f'{MDI.SEARCH} Derin', font_name=ICON_FONT, group='m', state='down' if s.tm == 'deep' else 'normal', font_size=sp(12), background_normal='', background_color=app.tc('acc') if s.tm == 'deep' else app.tc('card2'))
         s.db.bind(on_press=lambda x: s.sm('deep'))
         mode_row.add_widget(s.db)
+        
+        s.ab = ToggleButton(text=f'{MDI.INFO} API', font_name=ICON_FONT, group='m', state='down' if s.tm == 'api' else 'normal', font_size=sp(12), background_normal='', background_color=app.tc('acc') if s.tm == 'api' else app.tc('card2'))
+        s.ab.bind(on_press=lambda x: s.sm('api'))
+        mode_row.add_widget(s.ab)
         mode_card.add_widget(mode_row)
         root.add_widget(mode_card)
         
@@ -1081,6 +665,7 @@ class AutoInputScreen(BaseScreen):
         db.set('mode', m)
         s.qb.background_color = app.tc('acc') if m == 'quick' else app.tc('card2')
         s.db.background_color = app.tc('acc') if m == 'deep' else app.tc('card2')
+        s.ab.background_color = app.tc('acc') if m == 'api' else app.tc('card2')
     
     def start(s, *a):
         txt = s.txt_inp.text.strip()
@@ -1197,6 +782,10 @@ class ManualInputScreen(BaseScreen):
         paste_btn = Button(text=MDI.PASTE, font_name=ICON_FONT, font_size=sp(20), size_hint=(None, None), size=(dp(50), dp(50)), background_normal='', background_color=app.tc('acc'))
         paste_btn.bind(on_press=lambda x: setattr(s.url_inp, 'text', Clipboard.paste() or ''))
         url_row.add_widget(paste_btn)
+        
+        file_btn = Button(text=MDI.FOLDER, font_name=ICON_FONT, font_size=sp(20), size_hint=(None, None), size=(dp(50), dp(50)), background_normal='', background_color=app.tc('info'))
+        file_btn.bind(on_press=s.pick_file)
+        url_row.add_widget(file_btn)
         url_card.add_widget(url_row)
         
         # Quick fav
@@ -1253,11 +842,26 @@ class ManualInputScreen(BaseScreen):
         for f, b in s.fmt_btns.items():
             b.background_color = app.tc('acc') if f == s.fmt else app.tc('card2')
     
+    def pick_file(s, *a):
+        app = App.get_running_app()
+        c = BoxLayout(orientation='vertical', padding=dp(10), spacing=dp(10))
+        fc = FileChooserListView(path=iptv_folder(), filters=['*.m3u', '*.m3u8', '*.txt', '*.gz'])
+        c.add_widget(fc)
+        btn = Button(text='Sec', size_hint_y=None, height=dp(44), background_normal='', background_color=app.tc('acc'))
+        c.add_widget(btn)
+        p = Popup(title='', content=c, size_hint=(0.95, 0.85), separator_height=0)
+        def sel(x):
+            if fc.selection: s.url_inp.text = fc.selection[0]
+            p.dismiss()
+        btn.bind(on_press=sel)
+        p.open()
+    
     def load(s, *a):
         url = s.url_inp.text.strip()
+        if url.startswith('file://'): url = url[7:]
         if not url:
             return s.popup(MDI.ALERT, 'URL girin!')
-        if not url.startswith('http'):
+        if not url.startswith('http') and not os.path.isfile(url):
             return s.popup(MDI.CLOSE, 'Gecersiz URL!')
         s.show_load()
         threading.Thread(target=s._load, args=(url,), daemon=True).start()
@@ -1265,19 +869,14 @@ class ManualInputScreen(BaseScreen):
     def _load(s, url):
         try:
             Clock.schedule_once(lambda dt: s.upd_load(10, 'Baglaniyor...'))
-            r = http.get(url, timeout=30)
-            Clock.schedule_once(lambda dt: s.upd_load(50, 'Ayristiriliyor...'))
-            chs, grps, exp = parse_m3u(r.text, url)
+            if url.startswith('http'):
+                Clock.schedule_once(lambda dt: s.upd_load(30, 'Indiriliyor...'))
+                chs, grps, exp = fetch_m3u(url, dup=s.dup)
+            else:
+                Clock.schedule_once(lambda dt: s.upd_load(30, 'Dosya okunuyor...'))
+                chs, grps, exp = load_m3u(url, dup=s.dup)
             if not chs:
                 return Clock.schedule_once(lambda dt: s._err('Kanal bulunamadi!'))
-            Clock.schedule_once(lambda dt: s.upd_load(80, 'Isleniyor...'))
-            if s.dup:
-                chs, _ = dedup(chs)
-                grps = {}
-                for c in chs:
-                    g = c['group']
-                    if g not in grps: grps[g] = {'chs': [], 'logo': c.get('logo', ''), 'cty': detect_c(g)}
-                    grps[g]['chs'].append(c)
             Clock.schedule_once(lambda dt: s.upd_load(100, 'Tamamlandi!'))
             Clock.schedule_once(lambda dt: s._ok(chs, grps, exp, url), 0.2)
         except Exception as e:
@@ -1357,7 +956,8 @@ class ChannelListScreen(BaseScreen):
         
         # Info bar
         info = BoxLayout(size_hint_y=None, height=dp(60), orientation='vertical', spacing=dp(2))
-        info.add_widget(Label(text=f'{len(grps)} grup | {len(chs)} kanal', font_size=sp(12), color=app.tc('t3')))
+        dtx = f' | {chs.ndup} tekrar silindi' if chs.ndup else ''
+        info.add_widget(Label(text=f'{len(grps)} grup | {len(chs)} kanal{dtx}', font_size=sp(12), color=app.tc('t3')))
         exp_clr = app.tc('err') if 'EXPIRED' in exp else app.tc('warn')
         info.add_widget(Label(text=f'{MDI.CALENDAR} Bitis: {exp or "Bilinmiyor"}', font_name=ICON_FONT, font_size=sp(11), color=exp_clr))
         s.sel_lbl = Label(text='Secilen: 0 grup', font_size=sp(11), color=app.tc('ok'))
@@ -1375,7 +975,7 @@ class ChannelListScreen(BaseScreen):
         
         # RecycleView
         s.rv = RV()
-        s.all_data = [{'gn': gn, 'cnt': len(gd['chs']), 'cty': gd.get('cty', 'other'), 'sel': False, 'cb': s.on_sel} for gn, gd in sorted(grps.items())]
+        s.all_data = [{'gn': gn, 'cnt': len(gd['ix']), 'cty': gd.get('cty', 'other'), 'sel': False, 'cb': s.on_sel} for gn, gd in sorted(grps.items())]
         s.rv_data = s.all_data.copy()
         s.rv.data = s.rv_data
         root.add_widget(s.rv)
@@ -1404,7 +1004,7 @@ class ChannelListScreen(BaseScreen):
         if sel: s.sel.add(gn)
         else: s.sel.discard(gn)
         grps = getattr(App.get_running_app(), 'grps', {})
-        tot = sum(len(grps[g]['chs']) for g in s.sel if g in grps)
+        tot = sum(len(grps[g]['ix']) for g in s.sel if g in grps)
         s.sel_lbl.text = f'Secilen: {len(s.sel)} grup ({tot} kanal)'
     
     def sel_all(s, *a):
@@ -1415,7 +1015,7 @@ class ChannelListScreen(BaseScreen):
         s.rv_data = s.all_data.copy()
         s.rv.data = s.rv_data
         s.rv.refresh_from_data()
-        tot = sum(len(grps[g]['chs']) for g in s.sel if g in grps)
+        tot = sum(len(grps[g]['ix']) for g in s.sel if g in grps)
         s.sel_lbl.text = f'Secilen: {len(s.sel)} grup ({tot} kanal)'
     
     def add_fav(s):
@@ -1429,9 +1029,8 @@ class ChannelListScreen(BaseScreen):
         if not s.sel:
             return s.popup_err('Grup secin!')
         app = App.get_running_app()
-        grps, fmt, exp, url = getattr(app, 'grps', {}), getattr(app, 'fmt', 'm3u8'), getattr(app, 'exp', ''), getattr(app, 'surl', '')
-        chs = [c for gn in s.sel if gn in grps for c in grps[gn]['chs']]
-        content = gen_m3u(chs)
+        chs, fmt, exp, url = app.chs, getattr(app, 'fmt', 'm3u8'), getattr(app, 'exp', ''), getattr(app, 'surl', '')
+        ix = chs.pick(s.sel)
         path = iptv_folder()
         
         if exp and 'EXPIRED' not in exp:
@@ -1439,13 +1038,12 @@ class ChannelListScreen(BaseScreen):
         else:
             exp_str = datetime.now().strftime('%d%m%Y')
         
-        fname = f'bitis{exp_str}_{short_dom(url)}{FMTS.get(fmt, ".m3u8")}'
+        fname = f'bitis{exp_str}_{short_dom(url)}{out_ext(fmt)}'
         
         try:
-            with open(os.path.join(path, fname), 'w', encoding='utf-8') as f:
-                f.write(content)
-            db.stat(ch=len(chs), fi=1)
-            s.popup_ok(f'{len(chs)} kanal kaydedildi!\n\nIPTV/{fname}')
+            sz = write_m3u(os.path.join(path, fname), chs, ix)
+            db.stat(ch=len(ix), fi=1)
+            s.popup_ok(f'{len(ix)} kanal kaydedildi!\n\nIPTV/{fname}\n{sz / 1e6:.1f} MB')
         except Exception as e:
             s.popup_err(str(e)[:30])
         gc_()
@@ -1481,7 +1079,7 @@ class ChannelListScreen(BaseScreen):
 class TestingScreen(BaseScreen):
     def on_enter(s):
         s.clear_widgets()
-        s.testing, s.wk, s.fl = True, [], []
+        s.testing, s.cont, s.wk, s.fl, s.hl = True, False, [], [], {}
         Clock.schedule_once(lambda dt: s.build(), 0.05)
         Clock.schedule_once(lambda dt: s.run(), 0.2)
     
@@ -1531,10 +1129,16 @@ class TestingScreen(BaseScreen):
         log_card.add_widget(scrl)
         root.add_widget(log_card)
         
-        # Action button
-        s.act_btn = Button(text=f'{MDI.CLOSE} Iptal', font_name=ICON_FONT, font_size=sp(14), bold=True, size_hint_y=None, height=dp(56), background_normal='', background_color=app.tc('err'))
+        # Action buttons
+        act_row = BoxLayout(size_hint_y=None, height=dp(56), spacing=dp(10))
+        s.act_btn = Button(text=f'{MDI.CLOSE} Iptal', font_name=ICON_FONT, font_size=sp(14), bold=True, background_normal='', background_color=app.tc('err'))
         s.act_btn.bind(on_press=s.on_act)
-        root.add_widget(s.act_btn)
+        act_row.add_widget(s.act_btn)
+        # Continue with the links that worked so far while the rest are still being tested
+        s.go_btn = Button(text=f'{MDI.NEXT} Devam (0)', font_name=ICON_FONT, font_size=sp(14), bold=True, disabled=True, background_normal='', background_color=app.tc('ok'))
+        s.go_btn.bind(on_press=s.go_part)
+        act_row.add_widget(s.go_btn)
+        root.add_widget(act_row)
         
         s.add_widget(root)
     
@@ -1548,11 +1152,13 @@ class TestingScreen(BaseScreen):
         app = App.get_running_app()
         lks, m = getattr(app, 'tlks', []), getattr(app, 'tm', 'deep')
         tot = len(lks)
-        for i, lk in enumerate(lks):
-            if not s.testing: break
+        acc = len(group_links(lks))
+        Clock.schedule_once(lambda dt: s.log(f'{MDI.LINK} {tot} link, {acc} hesap test ediliyor', 't'))
+        breaker.on = lambda h, st: Clock.schedule_once(lambda dt: s.log(
+            f'{MDI.ALERT} {h}: yanit yok, {BRK_COOL}s atlaniyor' if st == 'open' else f'{MDI.CHECK} {h}: tekrar erisilebilir', 'er' if st == 'open' else 'ok'))
+        run = atest_links if db.get('engine', 'thread') == 'async' else test_links
+        for i, (lk, (ok, msg)) in enumerate(run(lks, m, int(db.get('to', '12')), stop=lambda: not s.testing)):
             dm = short_dom(lk)
-            Clock.schedule_once(lambda dt, d=dm: s.log(f'{MDI.LINK} {d}', 't'))
-            ok, msg = test_link(lk, m)
             if ok:
                 s.wk.append(lk)
                 Clock.schedule_once(lambda dt, d=dm, m=msg: s.log(f'{MDI.CHECK} {d}: {m}', 'ok'))
@@ -1561,9 +1167,21 @@ class TestingScreen(BaseScreen):
                 Clock.schedule_once(lambda dt, d=dm, m=msg: s.log(f'{MDI.CLOSE} {d}: {m}', 'er'))
             p = ((i + 1) / tot) * 100
             Clock.schedule_once(lambda dt, pp=p, c=i+1, t=tot: s.up(pp, c, t))
+        if s.testing and s.wk and db.get('health', 'false') == 'true': s._health()
         db.stat(te=len(lks), wo=len(s.wk))
         Clock.schedule_once(lambda dt: s.done())
     
+    def _health(s):
+        # Stream sampling of the working playlists, one per account
+        accs = group_links(s.wk)
+        for j, (lk, mem) in enumerate(accs.items()):
+            if not s.testing: break
+            Clock.schedule_once(lambda dt, c=j+1, t=len(accs): setattr(s.prog_lbl, 'text', f'Saglik: {c}/{t}'))
+            h = playlist_health(lk)
+            if not h: continue
+            for u in mem: s.hl[u] = h
+            Clock.schedule_once(lambda dt, d=short_dom(lk), h=h: s.log(f"{MDI.PLAY} {d}: {h['score']}/100 ({h['ok']}/{h['n']} yayin, {h['ttfb']:.1f}s)", 'ok' if h['score'] >= 50 else 'er'))
+    
     def log(s, txt, tp):
         app = App.get_running_app()
         clrs = {'t': app.tc('t3'), 'ok': app.tc('ok'), 'er': app.tc('err')}
@@ -1578,15 +1196,19 @@ class TestingScreen(BaseScreen):
         s.prog_lbl.text = f'Test: {c}/{t}'
         s.pct.text = f'%{int(p)}'
         s.stat_lbl.text = f'{MDI.CHECK} {len(s.wk)}  |  {MDI.CLOSE} {len(s.fl)}'
+        if s.testing:
+            s.go_btn.text, s.go_btn.disabled = f'{MDI.NEXT} Devam ({len(s.wk)})', not s.wk
     
     def done(s):
         app = App.get_running_app()
         s.testing = False
+        if s.cont: return
+        s.go_btn.parent.remove_widget(s.go_btn)
         s.prog_lbl.text = 'Tamamlandi!'
         s.pct.text = '%100'
         s.act_btn.text = f'{MDI.NEXT} Devam'
         s.act_btn.background_color = app.tc('ok')
-        app.wlks, app.flks = s.wk, s.fl
+        app.wlks, app.flks, app.hlth = s.wk, s.fl, s.hl
     
     def on_act(s, *a):
         if 'Iptal' in s.act_btn.text:
@@ -1599,6 +1221,14 @@ class TestingScreen(BaseScreen):
             gc_()
             s.manager.current = 'ar'
     
+    def go_part(s, *a):
+        # Unstarted tests are dropped; results still in flight are not shown
+        s.testing, s.cont = False, True
+        app = App.get_running_app()
+        app.wlks, app.flks, app.hlth = list(s.wk), list(s.fl), dict(s.hl)
+        gc_()
+        s.manager.current = 'ar'
+    
     def popup(s, msg):
         app = App.get_running_app()
         c = BoxLayout(orientation='vertical', padding=dp(20), spacing=dp(12))
@@ -1649,6 +1279,21 @@ class AutoResultScreen(BaseScreen):
         
         root.add_widget(Label(text=f'{w} link = {w} ayri dosya olusturulacak', font_size=sp(12), color=app.tc('info'), size_hint_y=None, height=dp(24)))
         
+        # Stream health
+        hl = getattr(app, 'hlth', {})
+        if hl:
+            best = sorted(((h['score'], lk) for lk, h in hl.items()), reverse=True)[:3]
+            hl_card = BoxLayout(orientation='vertical', padding=dp(14), spacing=dp(4), size_hint_y=None, height=dp(40 + 20 * len(best)))
+            with hl_card.canvas.before:
+                Color(*app.tc('card'))
+                hl_card._bg = RoundedRectangle(pos=hl_card.pos, size=hl_card.size, radius=[dp(14)])
+            hl_card.bind(pos=s._upd, size=s._upd)
+            avg = sum(h['score'] for h in hl.values()) // len(hl)
+            hl_card.add_widget(Label(text=f'{MDI.PLAY} Yayin sagligi: ort. {avg}/100', font_name=ICON_FONT, font_size=sp(12), bold=True, color=app.tc('t1'), size_hint_y=None, height=dp(18)))
+            for sc, lk in best:
+                hl_card.add_widget(Label(text=f'{short_dom(lk)}: {sc}/100', font_size=sp(11), color=app.tc('ok' if sc >= 50 else 'warn'), size_hint_y=None, height=dp(16)))
+            root.add_widget(hl_card)
+        
         # Options
         for title, desc, clr, scr, icon in [
             ('Otomatik', f'Ulke sec, {w} ayri dosya', 'acc', 'cs', MDI.MAGIC),
@@ -1750,6 +1395,13 @@ class CountrySelectScreen(BaseScreen):
             fmt_row.add_widget(btn)
         root.add_widget(fmt_row)
         
+        # Merge
+        mg_row = BoxLayout(size_hint_y=None, height=dp(40), spacing=dp(8))
+        mg_row.add_widget(Label(text='Tek dosyada birlestir (tekrarsiz):', font_size=sp(11), color=app.tc('t3')))
+        s.mg_sw = Switch(active=getattr(app, 'omerge', False), size_hint_x=None, width=dp(80))
+        mg_row.add_widget(s.mg_sw)
+        root.add_widget(mg_row)
+        
         # Process button
         proc_btn = Button(text=f'{MDI.ROCKET} Olustur', font_name=ICON_FONT, font_size=sp(14), bold=True, size_hint_y=None, height=dp(54), background_normal='', background_color=app.tc('ok'))
         proc_btn.bind(on_press=s.proc)
@@ -1777,7 +1429,7 @@ class CountrySelectScreen(BaseScreen):
         if not s.sel:
             return s.popup('Ulke secin!')
         app = App.get_running_app()
-        app.sctrs, app.ofmt = s.sel, s.fmt
+        app.sctrs, app.ofmt, app.omerge = s.sel, s.fmt, s.mg_sw.active
         s.manager.current = 'pr'
     
     def popup(s, msg):
@@ -1852,39 +1504,53 @@ class ProcessingScreen(BaseScreen):
         app = App.get_running_app()
         lks, ctrs, fmt = getattr(app, 'wlks', []), getattr(app, 'sctrs', set()), getattr(app, 'ofmt', 'm3u8')
         tl, tch, tflt = len(lks), 0, 0
-        path, ext = iptv_folder(), FMTS.get(fmt, '.m3u8')
-        
-        for i, lk in enumerate(lks):
+        path, ext, chl = iptv_folder(), out_ext(fmt), db.get('chcty', 'false') == 'true'
+        mg = Merger() if getattr(app, 'omerge', False) else None
+        
+        def stage(lk):
+            # Download + parse (streamed) and filter, on a fetcher thread; only the kept rows are queued
+            chs, grps, exp = fetch_m3u(lk)
+            if chl:
+                cc = chan_cty(chs)
+                ix = pick_cty(cc, ctrs)
+                return len(chs), chs.sub(ix), exp, bytearray(map(cc.__getitem__, ix))
+            return len(chs), chs.sub(chs.pick(gn for gn, gd in grps.items() if gd.get('cty', 'other') in ctrs)), exp, None
+        
+        # This thread is the single writer
+        for i, (lk, res) in enumerate(fetch_many(lks, stage)):
             dm = short_dom(lk)
             Clock.schedule_once(lambda dt, d=dm: setattr(s.cur_lbl, 'text', f'{MDI.LINK} {d}'))
-            Clock.schedule_once(lambda dt, p=((i + 0.3) / tl) * 100: s._up(p))
             
             try:
-                r = http.get(lk, timeout=30)
-                chs, grps, exp = parse_m3u(r.text, lk)
-                tch += len(chs)
-                
-                fchs = [c for gn, gd in grps.items() if gd.get('cty', 'other') in ctrs for c in gd['chs']]
+                if isinstance(res, Exception): raise res
+                n, fchs, exp, cc = res
+                tch += n
                 tflt += len(fchs)
                 Clock.schedule_once(lambda dt, t=tch, f=tflt: s._us(t, f))
                 
-                if fchs:
-                    content = gen_m3u(fchs)
+                if fchs and mg:
+                    mg.add(dm, fchs, None, cc, src_ms(lk))
+                    Clock.schedule_once(lambda dt, n=len(mg.out): setattr(s.fil_lbl, 'text', f'{MDI.FILE} Birlesik: {n} kanal'))
+                elif fchs:
                     if exp and 'EXPIRED' not in exp:
                         exp_str = exp.replace('.', '')
                     else:
                         exp_str = datetime.now().strftime('%d%m%Y')
                     
                     fname = f'bitis{exp_str}_{dm}{ext}'
-                    with open(os.path.join(path, fname), 'w', encoding='utf-8') as f:
-                        f.write(content)
+                    write_m3u(os.path.join(path, fname), fchs, None, cc)
                     s.fls.append({'n': fname, 'c': len(fchs), 'e': exp})
                     Clock.schedule_once(lambda dt, c=len(s.fls): setattr(s.fil_lbl, 'text', f'{MDI.FILE} Dosyalar: {c}'))
             except: pass
             
+            res = fchs = cc = None
             Clock.schedule_once(lambda dt, p=((i + 1) / tl) * 100: s._up(p))
             if i % 3 == 0: gc_()
         
+        if mg and len(mg.out):
+            fname = f"birlesik_{datetime.now().strftime('%d%m%Y')}{ext}"
+            write_m3u(os.path.join(path, fname), mg.out)
+            s.fls.append({'n': fname, 'c': len(mg.out), 'e': '', 'src': mg.stats})
         db.stat(ch=tflt, fi=len(s.fls))
         app.sfls, app.tflt, app.tch = s.fls, tflt, tch
         Clock.schedule_once(lambda dt: s._up(100))
@@ -2026,9 +1692,8 @@ class LinkEditorScreen(BaseScreen):
         lk = getattr(app, 'elk', '')
         try:
             Clock.schedule_once(lambda dt: s._ul(10, 'Baglaniyor...'))
-            r = http.get(lk, timeout=30)
-            Clock.schedule_once(lambda dt: s._ul(50, 'Ayristiriliyor...'))
-            s.chs, s.grps, s.exp = parse_m3u(r.text, lk)
+            Clock.schedule_once(lambda dt: s._ul(30, 'Indiriliyor...'))
+            s.chs, s.grps, s.exp = fetch_m3u(lk)
             Clock.schedule_once(lambda dt: s._ul(100, 'Tamam!'))
             Clock.schedule_once(lambda dt: s._show(), 0.2)
         except Exception as e:
@@ -2050,7 +1715,7 @@ class LinkEditorScreen(BaseScreen):
         
         s.stats_lbl.text = f'{len(s.grps)} grup | {len(s.chs)} kanal'
         
-        s.rv_data = [{'gn': gn, 'cnt': len(gd['chs']), 'cty': gd.get('cty', 'other'), 'sel': False, 'cb': s.on_sel} for gn, gd in sorted(s.grps.items())]
+        s.rv_data = [{'gn': gn, 'cnt': len(gd['ix']), 'cty': gd.get('cty', 'other'), 'sel': False, 'cb': s.on_sel} for gn, gd in sorted(s.grps.items())]
         s.rv.data = s.rv_data
     
     def _err(s, m):
@@ -2060,7 +1725,7 @@ class LinkEditorScreen(BaseScreen):
         s.rv_data[idx]['sel'] = sel
         if sel: s.sel.add(gn)
         else: s.sel.discard(gn)
-        tot = sum(len(s.grps[g]['chs']) for g in s.sel if g in s.grps)
+        tot = sum(len(s.grps[g]['ix']) for g in s.sel if g in s.grps)
         s.sel_lbl.text = f'Secilen: {len(s.sel)} grup ({tot} kanal)'
     
     def save(s, *a):
@@ -2068,8 +1733,7 @@ class LinkEditorScreen(BaseScreen):
         if not s.sel:
             return s.popup('Grup secin!')
         
-        chs = [c for gn in s.sel if gn in s.grps for c in s.grps[gn]['chs']]
-        content = gen_m3u(chs)
+        ix = s.chs.pick(s.sel)
         lk = getattr(app, 'elk', '')
         path, dm = iptv_folder(), short_dom(lk)
         
@@ -2078,13 +1742,12 @@ class LinkEditorScreen(BaseScreen):
         else:
             exp_str = datetime.now().strftime('%d%m%Y')
         
-        fname = f'bitis{exp_str}_{dm}.m3u8'
+        fname = f'bitis{exp_str}_{dm}{out_ext("m3u8")}'
         
         try:
-            with open(os.path.join(path, fname), 'w', encoding='utf-8') as f:
-                f.write(content)
-            db.stat(ch=len(chs), fi=1)
-            s.popup_ok(fname, len(chs))
+            write_m3u(os.path.join(path, fname), s.chs, ix)
+            db.stat(ch=len(ix), fi=1)
+            s.popup_ok(fname, len(ix))
         except Exception as e:
             s.popup(str(e)[:25])
         gc_()
@@ -2167,6 +1830,10 @@ class CompleteScreen(BaseScreen):
             if len(fls) > 5:
                 fb.add_widget(Label(text=f'... ve {len(fls) - 5} dosya daha', font_size=sp(9), color=app.tc('t4'), size_hint_y=None, height=dp(14)))
             
+            # Merge: channels added / duplicates collapsed per source
+            for src, ad, dn in fls[0].get('src', []):
+                fb.add_widget(Label(text=f'{src}: +{ad} kanal, {dn} tekrar atlandi', font_size=sp(9), color=app.tc('t3'), size_hint_y=None, height=dp(14), halign='left'))
+            
             scrl.add_widget(fb)
             root.add_widget(scrl)
         
@@ -2201,6 +1868,7 @@ class FavoritesScreen(BaseScreen):
     def build(s):
         app = App.get_running_app()
         favs = db.favs()
+        s.hs_lbls = {}
         
         root = BoxLayout(orientation='vertical', padding=dp(14), spacing=dp(12))
         
@@ -2240,7 +1908,10 @@ class FavoritesScreen(BaseScreen):
                 det = f"{fav.get('cnt', 0)} ch"
                 if fav.get('exp') and 'EXPIRED' not in fav['exp']:
                     det += f" | {fav['exp']}"
-                info.add_widget(Label(text=det, font_size=sp(10), color=app.tc('t3'), halign='left'))
+                det_lbl = Label(text=s._det(det, db.hs_get(fav['url'])), font_size=sp(10), color=app.tc('t3'), halign='left')
+                det_lbl.base = det
+                s.hs_lbls[fav['url']] = det_lbl
+                info.add_widget(det_lbl)
                 item.add_widget(info)
                 
                 btn_box = BoxLayout(orientation='vertical', size_hint_x=None, width=dp(48), spacing=dp(4))
@@ -2260,12 +1931,28 @@ class FavoritesScreen(BaseScreen):
             
             scrl.add_widget(lst)
             root.add_widget(scrl)
+            if db.get('health', 'false') == 'true':
+                threading.Thread(target=s._health, args=([f['url'] for f in favs],), daemon=True).start()
         
         s.add_widget(root)
     
     def _upd(s, w, v):
         if hasattr(w, '_bg'): w._bg.pos, w._bg.size = w.pos, w.size
     
+    @staticmethod
+    def _det(det, h):
+        return f"{det} | Saglik {h['score']}/100" if h else det
+    
+    def _health(s, urls):
+        # Re-score favorites without a result from the last day
+        for u in urls:
+            h = db.hs_get(u)
+            if h and time.time() - h['ts'] < 86400: continue
+            if s.manager.current != 'fv': break
+            h = playlist_health(u)
+            lbl = s.hs_lbls.get(u)
+            if h and lbl: Clock.schedule_once(lambda dt, l=lbl, h=h: setattr(l, 'text', s._det(l.base, h)))
+    
     def use_fav(s, btn):
         s.manager.current = 'mi'
         Clock.schedule_once(lambda dt: s._fill(btn.url), 0.2)
@@ -2325,7 +2012,7 @@ class SettingsScreen(BaseScreen):
         mode_row.add_widget(Label(text='Mod:', font_size=sp(11), color=app.tc('t3'), size_hint_x=0.2))
         tm = db.get('mode', 'deep')
         s.mode_btns = {}
-        for mid, mn in [('quick', 'Hizli'), ('deep', 'Derin')]:
+        for mid, mn in [('quick', 'Hizli'), ('deep', 'Derin'), ('api', 'API')]:
             is_sel = mid == tm
             btn = ToggleButton(text=mn, group='tm', state='down' if is_sel else 'normal', font_size=sp(12), background_normal='', background_color=app.tc('acc') if is_sel else app.tc('card2'))
             btn.mid = mid
@@ -2334,6 +2021,19 @@ class SettingsScreen(BaseScreen):
             mode_row.add_widget(btn)
         test_card.add_widget(mode_row)
         
+        eng_row = BoxLayout(size_hint_y=None, height=dp(44), spacing=dp(10))
+        eng_row.add_widget(Label(text='Motor:', font_size=sp(11), color=app.tc('t3'), size_hint_x=0.2))
+        te = db.get('engine', 'thread')
+        s.eng_btns = {}
+        for eid, en in [('thread', 'Thread'), ('async', 'Async')]:
+            is_sel = eid == te
+            btn = ToggleButton(text=en, group='te', state='down' if is_sel else 'normal', font_size=sp(12), background_normal='', background_color=app.tc('acc') if is_sel else app.tc('card2'))
+            btn.eid = eid
+            btn.bind(on_press=s.ch_engine)
+            s.eng_btns[eid] = btn
+            eng_row.add_widget(btn)
+        test_card.add_widget(eng_row)
+        
         to_row = BoxLayout(size_hint_y=None, height=dp(44), spacing=dp(10))
         to_row.add_widget(Label(text='Timeout:', font_size=sp(11), color=app.tc('t3'), size_hint_x=0.2))
         s.to_lbl = Label(text=db.get('to', '12') + 's', font_size=sp(13), bold=True, color=app.tc('acc'), size_hint_x=0.15)
@@ -2342,6 +2042,39 @@ class SettingsScreen(BaseScreen):
         to_sl.bind(value=s.ch_to)
         to_row.add_widget(to_sl)
         test_card.add_widget(to_row)
+        
+        tj_row = BoxLayout(size_hint_y=None, height=dp(44), spacing=dp(10))
+        tj_row.add_widget(Label(text='Paralel:', font_size=sp(11), color=app.tc('t3'), size_hint_x=0.2))
+        s.tj_lbl = Label(text=db.get('tjobs', '16'), font_size=sp(13), bold=True, color=app.tc('acc'), size_hint_x=0.15)
+        tj_row.add_widget(s.tj_lbl)
+        tj_sl = Slider(min=1, max=32, value=int(db.get('tjobs', '16')), step=1)
+        tj_sl.bind(value=s.ch_tjobs)
+        tj_row.add_widget(tj_sl)
+        test_card.add_widget(tj_row)
+        
+        hg_row = BoxLayout(size_hint_y=None, height=dp(44), spacing=dp(10))
+        hg_row.add_widget(Label(text='Yavas istegi tekrarla:', font_size=sp(11), color=app.tc('t3')))
+        hg_sw = Switch(active=db.get('hedge', 'false') == 'true')
+        hg_sw.bind(active=lambda sw, a: db.set('hedge', 'true' if a else 'false'))
+        hg_row.add_widget(hg_sw)
+        test_card.add_widget(hg_row)
+        
+        hl_row = BoxLayout(size_hint_y=None, height=dp(44), spacing=dp(10))
+        hl_row.add_widget(Label(text='Yayin sagligi testi:', font_size=sp(11), color=app.tc('t3')))
+        hl_sw = Switch(active=db.get('health', 'false') == 'true')
+        hl_sw.bind(active=lambda sw, a: db.set('health', 'true' if a else 'false'))
+        hl_row.add_widget(hl_sw)
+        test_card.add_widget(hl_row)
+        
+        for key, lbl, mn, mx in [('hn', 'Ornek:', 3, 20), ('hjobs', 'Es zaman:', 1, 8)]:
+            hs_row = BoxLayout(size_hint_y=None, height=dp(44), spacing=dp(10))
+            hs_row.add_widget(Label(text=lbl, font_size=sp(11), color=app.tc('t3'), size_hint_x=0.2))
+            val = Label(text=db.get(key), font_size=sp(13), bold=True, color=app.tc('acc'), size_hint_x=0.15)
+            hs_row.add_widget(val)
+            hs_sl = Slider(min=mn, max=mx, value=int(db.get(key)), step=1)
+            hs_sl.bind(value=lambda sl, v, k=key, l=val: s.ch_int(k, l, v))
+            hs_row.add_widget(hs_sl)
+            test_card.add_widget(hs_row)
         sl.add_widget(test_card)
         
         # File
@@ -2366,11 +2099,50 @@ class SettingsScreen(BaseScreen):
         dup_row.add_widget(dup_sw)
         file_card.add_widget(dup_row)
         
+        gz_row = BoxLayout(size_hint_y=None, height=dp(44), spacing=dp(10))
+        gz_row.add_widget(Label(text='Sikistir (.gz):', font_size=sp(11), color=app.tc('t3')))
+        gz_sw = Switch(active=db.get('gz', 'false') == 'true')
+        gz_sw.bind(active=lambda sw, a: db.set('gz', 'true' if a else 'false'))
+        gz_row.add_widget(gz_sw)
+        file_card.add_widget(gz_row)
+        
+        cc_row = BoxLayout(size_hint_y=None, height=dp(44), spacing=dp(10))
+        cc_row.add_widget(Label(text='Kanal bazli ulke:', font_size=sp(11), color=app.tc('t3')))
+        cc_sw = Switch(active=db.get('chcty', 'false') == 'true')
+        cc_sw.bind(active=lambda sw, a: db.set('chcty', 'true' if a else 'false'))
+        cc_row.add_widget(cc_sw)
+        file_card.add_widget(cc_row)
+        
         file_card.add_widget(Label(text=f'{MDI.FOLDER} Kayit: Download/IPTV/', font_name=ICON_FONT, font_size=sp(10), color=app.tc('info'), size_hint_y=None, height=dp(20)))
         sl.add_widget(file_card)
         
         # Data
         data_card = s._sec(f'{MDI.DELETE} Veri')
+        pc_row = BoxLayout(size_hint_y=None, height=dp(44), spacing=dp(10))
+        pc_row.add_widget(Label(text='Playlist:', font_size=sp(11), color=app.tc('t3'), size_hint_x=0.2))
+        s.pc_lbl = Label(text=db.get('pcage', '24') + 'sa', font_size=sp(13), bold=True, color=app.tc('acc'), size_hint_x=0.15)
+        pc_row.add_widget(s.pc_lbl)
+        pc_sl = Slider(min=0, max=168, value=int(float(db.get('pcage', '24'))), step=1)
+        pc_sl.bind(value=s.ch_pcage)
+        pc_row.add_widget(pc_sl)
+        data_card.add_widget(pc_row)
+        s.pc_sz = Label(text=f'Onbellek: {plcache.size() / 1e6:.1f} MB', font_size=sp(10), color=app.tc('t3'), size_hint_y=None, height=dp(18))
+        data_card.add_widget(s.pc_sz)
+        data_card.add_widget(Label(text=f"Indirilen: {traffic['wire'] / 1e6:.1f} MB ag / {traffic['body'] / 1e6:.1f} MB veri", font_size=sp(10), color=app.tc('t3'), size_hint_y=None, height=dp(18)))
+        for key, lbl, mx in [('ltok', 'Test OK:', 168), ('ltfail', 'Test Hata:', 48)]:
+            lt_row = BoxLayout(size_hint_y=None, height=dp(44), spacing=dp(10))
+            lt_row.add_widget(Label(text=lbl, font_size=sp(11), color=app.tc('t3'), size_hint_x=0.2))
+            val = Label(text=db.get(key) + 'sa', font_size=sp(13), bold=True, color=app.tc('acc'), size_hint_x=0.15)
+            lt_row.add_widget(val)
+            lt_sl = Slider(min=0, max=mx, value=int(float(db.get(key))), step=1)
+            lt_sl.bind(value=lambda sl, v, k=key, l=val: s.ch_ttl(k, l, v))
+            lt_row.add_widget(lt_sl)
+            data_card.add_widget(lt_row)
+        s.lt_lbl = Label(text=f'Test kaydi: {db.lt_count()}  |  isabet {db.lth} / iskalama {db.ltm}', font_size=sp(10), color=app.tc('t3'), size_hint_y=None, height=dp(18))
+        data_card.add_widget(s.lt_lbl)
+        lt_btn = Button(text='Test Gecmisini Temizle', font_size=sp(12), size_hint_y=None, height=dp(44), background_normal='', background_color=app.tc('warn'))
+        lt_btn.bind(on_press=s.clr_tests)
+        data_card.add_widget(lt_btn)
         cache_btn = Button(text='Onbellek Temizle', font_size=sp(12), size_hint_y=None, height=dp(44), background_normal='', background_color=app.tc('info'))
         cache_btn.bind(on_press=s.clr_cache)
         data_card.add_widget(cache_btn)
@@ -2418,19 +2190,47 @@ class SettingsScreen(BaseScreen):
         for mid, b in s.mode_btns.items():
             b.background_color = app.tc('acc') if mid == btn.mid else app.tc('card2')
     
+    def ch_engine(s, btn):
+        app = App.get_running_app()
+        db.set('engine', btn.eid)
+        for eid, b in s.eng_btns.items():
+            b.background_color = app.tc('acc') if eid == btn.eid else app.tc('card2')
+    
     def ch_to(s, sl, val):
         s.to_lbl.text = f'{int(val)}s'
         db.set('to', str(int(val)))
     
+    def ch_tjobs(s, sl, val):
+        s.tj_lbl.text = str(int(val))
+        db.set('tjobs', str(int(val)))
+    
+    def ch_pcage(s, sl, val):
+        s.pc_lbl.text = f'{int(val)}sa'
+        db.set('pcage', str(int(val)))
+    
     def ch_fmt(s, btn):
         app = App.get_running_app()
         db.set('fmt', btn.fid)
         for fid, b in s.fmt_btns.items():
             b.background_color = app.tc('acc') if fid == btn.fid else app.tc('card2')
     
+    def ch_int(s, key, lbl, val):
+        lbl.text = str(int(val))
+        db.set(key, str(int(val)))
+    
+    def ch_ttl(s, key, lbl, val):
+        lbl.text = f'{int(val)}sa'
+        db.set(key, str(int(val)))
+    
+    def clr_tests(s, *a):
+        db.lt_del()
+        s.lt_lbl.text = 'Test kaydi: 0  |  isabet 0 / iskalama 0'
+        s.popup('Test gecmisi temizlendi!')
+    
     def clr_cache(s, *a):
-        cache.clear()
+        plcache.clear()
         detect_c.cache_clear()
+        s.pc_sz.text = 'Onbellek: 0.0 MB'
         gc_()
         s.popup('Onbellek temizlendi!')
     
@@ -2493,6 +2293,7 @@ class IPTVApp(App):
             return [1, 1, 1, 1]
     
     def on_stop(s):
+        bodies.clear()
         db.close()
         gc_()
 